@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+from algorithms.analysis_response import generate_range
+from enums.confidence import Confidence
+
+RANGE_FIELDS = ["confinement", "suspension", "probation"]
+BOOLEAN_FIELDS = ["fines_fees", "restitution", "life_sentence_indicator", "community_service", "diversion"]
+CONFIDENCE_LEVELS = list(Confidence)
+
+
+class AnalysisRecord:
+    """Lightweight view of one row of an `AnalysisBatch`"""
+    __slots__ = ("batch", "index")
+
+    def __init__(self, batch, index: int):
+        self.batch = batch
+        self.index = index
+
+    def __getattr__(self, column):
+        try:
+            return self.batch.columns[column][self.index]
+        except KeyError:
+            raise AttributeError(column) from None
+
+    def to_dict(self) -> dict:
+        return self.batch.row_dict(self.index)
+
+
+class AnalysisBatch:
+    """Column-oriented storage for the responses of many sentences
+
+    Holds one NumPy array per field instead of one `AnalysisResponse` dict per sentence. Day counts are int64 columns
+    paired with boolean `missing_*` masks, and confidence is stored as uint8 codes into `Confidence`.
+
+    Methods
+    -------
+    set(index, sentence_id, ...)
+        fills row `index`, taking the same arguments as `AnalysisResponse`
+    to_dicts()
+        rebuilds the `AnalysisResponse.response_data` dicts
+    to_pandas()
+        DataFrame sharing the underlying buffers where pandas allows it
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.columns = {
+            "id": np.empty(size, dtype=object),
+            "confidence": np.zeros(size, dtype=np.uint8)
+        }
+        for field in RANGE_FIELDS:
+            for bound in ["minimum", "maximum"]:
+                self.columns[f"{bound}_{field}"] = np.zeros(size, dtype=np.int64)
+                self.columns[f"missing_{bound}_{field}"] = np.ones(size, dtype=bool)
+            self.columns[f"{field}_source"] = np.empty(size, dtype=object)
+        for field in BOOLEAN_FIELDS:
+            self.columns[field] = np.zeros(size, dtype=bool)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index: int) -> AnalysisRecord:
+        if not -self.size <= index < self.size:
+            raise IndexError(index)
+        return AnalysisRecord(self, index % self.size)
+
+    def __iter__(self):
+        return (AnalysisRecord(self, index) for index in range(self.size))
+
+    def set(self, index: int, sentence_id: str, confidence: Confidence = Confidence.LOW, **kwargs):
+        self.columns["id"][index] = sentence_id
+        self.columns["confidence"][index] = CONFIDENCE_LEVELS.index(confidence)
+        for field in RANGE_FIELDS:
+            for bound in ["minimum", "maximum"]:
+                value = kwargs.get(f"{bound}_{field}")
+                self.columns[f"missing_{bound}_{field}"][index] = value is None
+                if value is not None:
+                    self.columns[f"{bound}_{field}"][index] = value
+            self.columns[f"{field}_source"][index] = kwargs.get(f"{field}_source")
+        for field in BOOLEAN_FIELDS:
+            self.columns[field][index] = kwargs.get(field, False)
+
+    @classmethod
+    def concat(cls, batches: list):
+        batch = cls(0)
+        batch.size = sum(len(b) for b in batches)
+        if batches:
+            batch.columns = {
+                column: np.concatenate([b.columns[column] for b in batches]) for column in batch.columns
+            }
+        return batch
+
+    def _days(self, bound: str, field: str, index: int):
+        if self.columns[f"missing_{bound}_{field}"][index]:
+            return None
+        return int(self.columns[f"{bound}_{field}"][index])
+
+    def row_dict(self, index: int) -> dict:
+        """Same schema as `AnalysisResponse.response_data`"""
+        row = {
+            "id": self.columns["id"][index],
+            "confidence": CONFIDENCE_LEVELS[self.columns["confidence"][index]].value
+        }
+        for field in RANGE_FIELDS:
+            row[f"{field}_range_days"] = generate_range(
+                min_value=self._days("minimum", field, index),
+                max_value=self._days("maximum", field, index),
+                source=self.columns[f"{field}_source"][index]
+            )
+        row["maximum_terms_of_confinement_days"] = self._days("maximum", "confinement", index)
+        for field in BOOLEAN_FIELDS:
+            row[field] = bool(self.columns[field][index])
+        return row
+
+    def to_dicts(self) -> list:
+        return [self.row_dict(index) for index in range(self.size)]
+
+    def to_pandas(self):
+        data = {
+            "id": self.columns["id"],
+            "confidence": pd.Categorical.from_codes(
+                self.columns["confidence"], categories=[level.value for level in CONFIDENCE_LEVELS]
+            )
+        }
+        for field in RANGE_FIELDS:
+            for bound in ["minimum", "maximum"]:
+                # IntegerArray wraps the values and missing-value mask without copying them
+                data[f"{bound}_{field}_days"] = pd.arrays.IntegerArray(
+                    self.columns[f"{bound}_{field}"], self.columns[f"missing_{bound}_{field}"]
+                )
+            data[f"{field}_source"] = self.columns[f"{field}_source"]
+        for field in BOOLEAN_FIELDS:
+            data[field] = self.columns[field]
+        return pd.DataFrame(data, copy=False)
+
+    def to_parquet(self, path: str):
+        """Requires pyarrow or fastparquet"""
+        self.to_pandas().to_parquet(path, index=False)
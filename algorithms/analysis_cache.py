@@ -0,0 +1,133 @@
+import json
+import sqlite3
+from collections import OrderedDict
+
+
+class AnalysisCache:
+    """Memoizes analyzer function results by normalized text
+
+    Results live in an in-memory LRU of at most `max_size` entries. When `db_path` is set they are also written to a
+    SQLite file so they survive process restarts. Rows written under a different `version` are deleted when the
+    database is opened, so changing the patterns an analyzer is built from invalidates the store. A value found in
+    memory is the very object returned to earlier callers, so callers must not mutate what they get back.
+
+    Attributes
+    ----------
+    version : str
+        hash of whatever the cached functions depend on
+    max_size : int
+        maximum number of entries kept in memory
+    db_path : str
+        optional path of the SQLite store
+    hits, disk_hits, misses, evictions : int
+        counters used to size the cache, including the lookups of worker processes added with `add_counters`
+    """
+
+    def __init__(self, version: str, max_size: int = 100000, db_path: str = None, commit_interval: int = 1000):
+        self.version = version
+        self.max_size = max_size
+        self.db_path = db_path
+        self.commit_interval = commit_interval
+        self._entries = OrderedDict()
+        self._connection = None
+        self._pending_writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getstate__(self):
+        # SQLite connections can't be pickled, each worker process opens its own
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        state["_pending_writes"] = 0
+        return state
+
+    @property
+    def connection(self):
+        if self._connection is None and self.db_path is not None:
+            self._connection = sqlite3.connect(self.db_path, timeout=60)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_cache ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, version TEXT NOT NULL, value TEXT NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            self._connection.execute("DELETE FROM analysis_cache WHERE version != ?", (self.version,))
+            self._connection.commit()
+        return self._connection
+
+    def get_or_compute(self, namespace: str, key: str, compute):
+        """Returns the cached value for `key`, calling `compute(key)` and storing the result on a miss"""
+        entry_key = (namespace, key)
+        if entry_key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(entry_key)
+            return self._entries[entry_key]
+
+        stored = self._load(namespace, key)
+        if stored is not None:
+            self.disk_hits += 1
+            value = stored[0]
+        else:
+            self.misses += 1
+            value = compute(key)
+            self._store(namespace, key, value)
+        self._remember(entry_key, value)
+        return value
+
+    def _remember(self, entry_key, value):
+        self._entries[entry_key] = value
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _load(self, namespace, key):
+        if self.connection is None:
+            return None
+        row = self.connection.execute(
+            "SELECT value FROM analysis_cache WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        # values are stored wrapped in a list so a cached None can be told apart from a missing row
+        return json.loads(row[0]) if row is not None else None
+
+    def _store(self, namespace, key, value):
+        if self.connection is None:
+            return
+        self.connection.execute(
+            "INSERT OR REPLACE INTO analysis_cache (namespace, key, version, value) VALUES (?, ?, ?, ?)",
+            (namespace, key, self.version, json.dumps([value]))
+        )
+        self._pending_writes += 1
+        if self._pending_writes >= self.commit_interval:
+            self.flush()
+
+    def flush(self):
+        if self._connection is not None and self._pending_writes:
+            self._connection.commit()
+            self._pending_writes = 0
+
+    def close(self):
+        self.flush()
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def counters(self) -> dict:
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses, "evictions": self.evictions}
+
+    def add_counters(self, counts: dict):
+        for name, value in counts.items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def stats(self) -> dict:
+        """Lookup counters and hit rate; `size` is the number of entries held in this process"""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0
+        }
@@ -7,7 +7,7 @@ def generate_range(min_value, max_value, source):
         min_value=min_value,
         max_value=max_value,
         source=source
-    ) if min_value is not None else None,
+    ) if min_value is not None else None
 
 
 class AnalysisResponse:
@@ -1,6 +1,182 @@
+import copy
+import itertools
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from algorithms.analysis_batch import AnalysisBatch
+from algorithms.analysis_response import AnalysisResponse
+from utilities import record_io
+
+_worker_analyzer = None
+
+
+def _init_worker(analyzer):
+    global _worker_analyzer
+    _worker_analyzer = analyzer
+
+
+def _analyze_chunk(method_name, chunk):
+    # counts made in the worker are sent back with the result, the parent's analyzer would never see them otherwise
+    before = _worker_analyzer.counters()
+    result = getattr(_worker_analyzer, method_name)(chunk)
+    after = _worker_analyzer.counters()
+    return result, {name: value - before.get(name, 0) for name, value in after.items()}
+
+
+def chunk_sentences(sentences, chunk_size: int):
+    """Yields consecutive lists of at most `chunk_size` items from any iterable of sentences"""
+    iterator = iter(sentences)
+    while chunk := list(itertools.islice(iterator, chunk_size)):
+        yield chunk
+
+
 class BaseAnalyzer:
-    def __init__(self, sentences: list):
-        self.sentences = sentences
+    """Base class for analyzers that turn sentences into `AnalysisResponse` data
 
-    def analyze(self):
+    Subclasses implement `response_fields`, returning the `AnalysisResponse` keyword arguments for a sentence, and may
+    override `batch_response_fields` when a whole chunk can be processed more efficiently at once. `analyze` then
+    runs either serially or, when `workers` is greater than one, over a process pool in chunks of `chunk_size`
+    sentences. `analyze_iter` and `analyze_file` do the same over any iterable of sentences with bounded memory, and
+    `analyze_columnar` fills an `AnalysisBatch` instead of dicts. Output order always matches the input order.
+
+    Attributes
+    ----------
+    sentences : list
+        dictionaries with at least `id` and `text` keys, may be left empty when only streaming
+    workers : int
+        number of worker processes, 1 runs in the current process and None uses every available CPU
+    chunk_size : int
+        number of sentences sent to a worker at a time
+    """
+
+    def __init__(self, sentences: list = None, workers: int = 1, chunk_size: int = 1000):
+        self.sentences = sentences if sentences is not None else []
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.chunk_size = chunk_size
+
+    def response_fields(self, sentence: dict) -> dict:
         raise NotImplementedError
+
+    def batch_response_fields(self, sentences: list) -> list:
+        return [self.response_fields(sentence) for sentence in sentences]
+
+    def analyze_sentence(self, sentence: dict) -> dict:
+        return self.analyze_batch([sentence])[0]
+
+    def after_batch(self):
+        """Called after each chunk of sentences, in whichever process analyzed it"""
+
+    def counters(self) -> dict:
+        """Counts kept while analyzing, e.g. cache hits, by name"""
+        return {}
+
+    def add_counters(self, counts: dict):
+        """Adds `counters` deltas made in a worker process to this analyzer's own"""
+
+    def analyze_batch(self, sentences: list) -> list:
+        responses = [
+            AnalysisResponse(sentence_id=sentence["id"], **fields).response_data
+            for sentence, fields in zip(sentences, self.batch_response_fields(sentences))
+        ]
+        self.after_batch()
+        return responses
+
+    def analyze_batch_columnar(self, sentences: list) -> AnalysisBatch:
+        batch = AnalysisBatch(len(sentences))
+        for index, (sentence, fields) in enumerate(zip(sentences, self.batch_response_fields(sentences))):
+            batch.set(index, sentence_id=sentence["id"], **fields)
+        self.after_batch()
+        return batch
+
+    def analyze(self):
+        if self.workers > 1 and len(self.sentences) > self.chunk_size:
+            return self.analyze_parallel()
+        return self.analyze_batch(self.sentences)
+
+    def analyze_parallel(self):
+        return list(self.analyze_iter())
+
+    def analyze_columnar(self) -> AnalysisBatch:
+        if self.workers > 1 and len(self.sentences) > self.chunk_size:
+            return AnalysisBatch.concat(list(self._map_chunks("analyze_batch_columnar", self.sentences)))
+        return self.analyze_batch_columnar(self.sentences)
+
+    def analyze_iter(self, sentences=None):
+        """Lazily yields responses for `sentences` (defaults to `self.sentences`), reading at most a few chunks ahead"""
+        for responses in self._map_chunks("analyze_batch", self.sentences if sentences is None else sentences):
+            yield from responses
+
+    def worker_pool(self, initializer, initargs: tuple) -> ProcessPoolExecutor:
+        """The process pool chunks are analyzed over when `workers` is greater than one"""
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=initializer, initargs=initargs)
+
+    def _map_chunks(self, method_name: str, sentences):
+        """Yields `method_name(chunk)` for each chunk in order, in this process or over a process pool"""
+        chunks = chunk_sentences(sentences, self.chunk_size)
+        if self.workers <= 1:
+            for chunk in chunks:
+                yield getattr(self, method_name)(chunk)
+            return
+
+        # ship a copy without the sentence list so each worker receives the analyzer once, not once per chunk
+        template = copy.copy(self)
+        template.sentences = []
+        with self.worker_pool(_init_worker, (template,)) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(_analyze_chunk, method_name, chunk))
+                if len(pending) >= 2 * self.workers:
+                    yield self._chunk_result(pending.popleft())
+            while pending:
+                yield self._chunk_result(pending.popleft())
+
+    def _chunk_result(self, future):
+        result, counts = future.result()
+        self.add_counters(counts)
+        return result
+
+    def analyze_file(self, input_path: str, output_path: str, checkpoint_path: str = None,
+                     checkpoint_interval: int = 10000, checkpoint_fields: dict = None, **reader_kwargs) -> int:
+        """Analyzes a CSV or JSONL file of {id, text} records into a JSONL file of responses
+
+        With `checkpoint_path` set, progress is recorded every `checkpoint_interval` records and a rerun after a crash
+        resumes from the last checkpoint, dropping any output written after it. The checkpoint records the input path
+        and `checkpoint_fields`, e.g. the model used, and resuming from a checkpoint where any of them differ raises
+        ValueError. Returns the number of records written.
+        """
+        identity = {"input_path": input_path, **(checkpoint_fields or {})}
+        checkpoint = record_io.load_checkpoint(checkpoint_path)
+        for key, value in identity.items() if checkpoint is not None else []:
+            if checkpoint.get(key) != value:
+                raise ValueError(
+                    f"Checkpoint {checkpoint_path} was written for {key} {checkpoint.get(key)}, not {value}"
+                )
+        records_written = checkpoint["records"] if checkpoint else 0
+        output_bytes = checkpoint["output_bytes"] if checkpoint else 0
+        if checkpoint is not None and checkpoint.get("complete"):
+            return records_written
+
+        records = itertools.islice(record_io.read_records(input_path, **reader_kwargs), records_written, None)
+        with open(output_path, "ab") as output_file:
+            output_file.truncate(output_bytes)
+            output_file.seek(output_bytes)
+            for response in self.analyze_iter(records):
+                output_file.write(record_io.to_jsonl_line(response))
+                records_written += 1
+                if checkpoint_path is not None and records_written % checkpoint_interval == 0:
+                    self._checkpoint(output_file, checkpoint_path, identity, records_written)
+            if checkpoint_path is not None:
+                self._checkpoint(output_file, checkpoint_path, identity, records_written, complete=True)
+        return records_written
+
+    @staticmethod
+    def _checkpoint(output_file, checkpoint_path, identity, records_written, complete=False):
+        output_file.flush()
+        os.fsync(output_file.fileno())
+        record_io.save_checkpoint(checkpoint_path, {
+            **identity,
+            "records": records_written,
+            "output_bytes": output_file.tell(),
+            "complete": complete
+        })
@@ -0,0 +1,63 @@
+from algorithms.base_analyzer import BaseAnalyzer
+from algorithms.regex_analyzer import RegexAnalyzer, has_sentencing_cue
+from algorithms.spacy_analyzer import SpacyAnalyzer
+from spacy_impl.model_registry import MODEL_REGISTRY
+
+
+class CascadeAnalyzer(BaseAnalyzer):
+    """Uses the regex layer as a gate in front of the spaCy model
+
+    Sentences without any duration, monetary amount or sentence type cue (see `has_sentencing_cue`) never reach the
+    NER pipeline. For the rest, fields found by the model take precedence and the regex analyzer fills in whatever
+    the model did not find.
+
+    Attributes
+    ----------
+    sentences_seen, sentences_skipped : int
+        counters `skip_rate` is derived from, including the sentences of worker processes
+    """
+
+    def __init__(self, sentences=None, model_path: str = None, nlp=None, batch_size: int = 256, workers: int = 1,
+                 chunk_size: int = 1000, cache=None):
+        super().__init__(sentences, workers=workers, chunk_size=chunk_size)
+        self.regex_analyzer = RegexAnalyzer(cache=cache)
+        self.spacy_analyzer = SpacyAnalyzer(model_path=model_path, nlp=nlp, batch_size=batch_size)
+        self.sentences_seen = 0
+        self.sentences_skipped = 0
+
+    @property
+    def skip_rate(self) -> float:
+        return self.sentences_skipped / self.sentences_seen if self.sentences_seen else 0.0
+
+    def worker_pool(self, initializer, initargs: tuple):
+        return MODEL_REGISTRY.worker_pool(self.workers, initializer, initargs)
+
+    def after_batch(self):
+        self.regex_analyzer.after_batch()
+
+    def counters(self) -> dict:
+        # the regex layer's cache counters are prefixed so they can't collide with the cascade's own
+        counts = {"sentences_seen": self.sentences_seen, "sentences_skipped": self.sentences_skipped}
+        counts.update({f"regex_{name}": value for name, value in self.regex_analyzer.counters().items()})
+        return counts
+
+    def add_counters(self, counts: dict):
+        self.sentences_seen += counts.get("sentences_seen", 0)
+        self.sentences_skipped += counts.get("sentences_skipped", 0)
+        self.regex_analyzer.add_counters(
+            {name[len("regex_"):]: value for name, value in counts.items() if name.startswith("regex_")}
+        )
+
+    def response_fields(self, sentence):
+        return self.batch_response_fields([sentence])[0]
+
+    def batch_response_fields(self, sentences):
+        candidates = [index for index, sentence in enumerate(sentences) if has_sentencing_cue(sentence["text"])]
+        self.sentences_seen += len(sentences)
+        self.sentences_skipped += len(sentences) - len(candidates)
+
+        fields = [{} for _ in sentences]
+        model_fields = self.spacy_analyzer.batch_response_fields([sentences[index] for index in candidates])
+        for index, sentence_model_fields in zip(candidates, model_fields):
+            fields[index] = {**self.regex_analyzer.response_fields(sentences[index]), **sentence_model_fields}
+        return fields
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
-from algorithms.analysis_response import AnalysisResponse
+from algorithms.analysis_cache import AnalysisCache
 from algorithms.base_analyzer import BaseAnalyzer
+from algorithms.sentence_type_matcher import SentenceTypeMatcher
 from utilities import utils
+import hashlib
+import json
+import os
 import re
 import string
 
@@ -28,40 +32,62 @@ MULTIPLIERS = dict([
 ])
 
 
+WORDS_TO_NUMBERS = {
+    'ninety': '90',
+    'eighty': '80',
+    'seventy': '70',
+    'sixty': '60',
+    'fifty': '50',
+    'forty': '40',
+    'thirty': '30',
+    'twenty': '20',
+    'nineteen': '19',
+    'eighteen': '18',
+    'seventeen': '17',
+    'sixteen': '16',
+    'fifteen': '15',
+    'fourteen': '14',
+    'thirteen': '13',
+    'twelve': '12',
+    'eleven': '11',
+    'ten': '10',
+    'one': '1',
+    'two': '2',
+    'three': '3',
+    'four': '4',
+    'five': '5',
+    'six': '6',
+    'seven': '7',
+    'eight': '8',
+    'nine': '9',
+    'zero': '0'
+}
+
+NUMBER_WORDS_RGX = re.compile(r'\b(' + '|'.join(WORDS_TO_NUMBERS.keys()) + r')\b', re.IGNORECASE)
+
+# Every character RGX can consume. A match never spans a character outside this set, so maximal runs of these
+# characters can be scanned independently, and runs without a digit can never hold a duration.
+CANDIDATE_WINDOW_RGX = re.compile(r"[\d\s\-\,\&\+\/ANDYERSMOTHWKU]+", re.IGNORECASE)
+
+DIGITS_RGX = re.compile(r'\d+')
+
+GROUP_UNITS = {name: re.sub(r'[\d]', '', name) for name in RGX.groupindex}
+
+MONETARY_CUE_RGX = re.compile(r"\$|\bFINE|\bCOST|\bFEE|RESTITUTION|\bDOLLAR", re.IGNORECASE)
+
+SENTENCE_TYPE_MATCHER = SentenceTypeMatcher.from_file(
+    os.path.join(os.path.dirname(__file__), "sentence_type_keywords.json")
+)
+
+# Changes whenever a pattern or table the cached functions depend on changes, invalidating persisted cache entries
+CACHE_VERSION = hashlib.sha256(json.dumps([
+    RGX.pattern, RGX.flags, CANDIDATE_WINDOW_RGX.pattern, MULTIPLIERS, WORDS_TO_NUMBERS, SENTENCE_TYPE_MATCHER.config
+]).encode()).hexdigest()
+
+
 def convert_to_digits(text):
     """Takes string and finds/converts alpha integers into digits"""
-    words_to_numbers = {
-        'ninety': '90',
-        'eighty': '80',
-        'seventy': '70',
-        'sixty': '60',
-        'fifty': '50',
-        'forty': '40',
-        'thirty': '30',
-        'twenty': '20',
-        'nineteen': '19',
-        'eighteen': '18',
-        'seventeen': '17',
-        'sixteen': '16',
-        'fifteen': '15',
-        'fourteen': '14',
-        'thirteen': '13',
-        'twelve': '12',
-        'eleven': '11',
-        'ten': '10',
-        'one': '1',
-        'two': '2',
-        'three': '3',
-        'four': '4',
-        'five': '5',
-        'six': '6',
-        'seven': '7',
-        'eight': '8',
-        'nine': '9',
-        'zero': '0'
-    }
-    pattern = re.compile(r'\b(' + '|'.join(words_to_numbers.keys()) + r')\b', re.IGNORECASE)
-    return re.sub(pattern, lambda x: words_to_numbers[x.group().lower()], text)
+    return NUMBER_WORDS_RGX.sub(lambda x: WORDS_TO_NUMBERS[x.group().lower()], text)
 
 
 def calculate_days(units):
@@ -73,18 +99,8 @@ def calculate_days(units):
 
 
 def classify_type(text):
-    """Classifies the type of sentence"""
-    substring_to_response_keys = {
-        'JAIL': ['maximum_confinement', 'minimum_confinement'],  # for now, setting min and max to the same value
-        'CONF': ['maximum_confinement', 'minimum_confinement'],
-        'PROB': ['probation_range'],
-        'SUSP': ['suspension_range']
-    }
-    # TODO: should we consider multiple matches or just first? I'll stick with first for now for simplicity.
-    for search_key, value in substring_to_response_keys.items():
-        search_result = re.search(search_key, text)  # finds first match and then returns result
-        if search_result is not None:
-            return value
+    """Classifies the type of sentence, returning the response keys of the highest priority keyword found"""
+    return SENTENCE_TYPE_MATCHER.classify(text)
 
 
 def process_adj_text(text, position='pre', max_length=10):
@@ -131,30 +147,131 @@ def get_durations(text):
     return results
 
 
+def candidate_windows(text):
+    """Yields (start, end) spans of `text` that RGX could find a duration in"""
+    for window in CANDIDATE_WINDOW_RGX.finditer(text):
+        if DIGITS_RGX.search(text, window.start(), window.end()) is not None:
+            yield window.span()
+
+
+def scan_durations(text):
+    """Same output as `get_durations`, but only runs RGX over candidate windows that contain a digit"""
+    return [result for _, _, result in scan_duration_spans(text)]
+
+
+def scan_duration_spans(text):
+    """Like `scan_durations`, but returns (start, end, duration) tuples with the position of each duration"""
+    results = []
+    phrases = set()
+    upper_text = text.upper()
+
+    for window_start, window_end in candidate_windows(upper_text):
+        for i in RGX.finditer(upper_text, window_start, window_end):
+            if i.lastindex is None:  # separators only, no duration group matched
+                continue
+            phrase = utils.cleanup_phrase(i.group())
+            if phrase in phrases:
+                continue
+            phrases.add(phrase)
+            start, end = i.span()
+            units = {}
+            for key, value in i.groupdict().items():
+                if value is not None:
+                    int_match = DIGITS_RGX.search(value)
+                    units[GROUP_UNITS[key]] = int(int_match.group(0) if int_match else 0)
+
+            days = calculate_days(units)
+
+            results.append((start, end, {
+                'days': days if days > 0 else None,
+                'units': units,
+                'text': phrase,
+                'pre_text': process_adj_text(upper_text[max(0, start - 12):start], 'pre'),
+                'post_text': process_adj_text(upper_text[end:end + 12], 'post')
+            }))
+
+    return results
+
+
 def duration_search(text: str = '') -> list:
     """Public function returns a list of durations from a string"""
     text = convert_to_digits(text)
-    results = get_durations(text)
+    results = scan_durations(text)
     return results
 
 
+def find_sentence_types(text: str = '') -> list:
+    """Returns every sentence type keyword hit, each linked to the nearest duration in the text
+
+    Offsets refer to the text after `convert_to_digits`. Each hit carries the nearest duration from `scan_durations`
+    under "duration" (None when the text has no duration), ties going to the earlier duration.
+    """
+    text = convert_to_digits(text)
+    durations = scan_duration_spans(text)
+    hits = SENTENCE_TYPE_MATCHER.search(text)
+    for hit in hits:
+        nearest = min(
+            durations, key=lambda span: max(span[0] - hit["end"], hit["start"] - span[1], 0), default=None
+        )
+        hit["duration"] = nearest[2] if nearest is not None else None
+    return hits
+
+
+def has_sentencing_cue(text: str) -> bool:
+    """Cheap check for a duration, monetary amount or sentence type keyword, used to gate slower analyzers"""
+    upper_text = text.upper()
+    return (
+        classify_type(upper_text) is not None
+        or MONETARY_CUE_RGX.search(upper_text) is not None
+        or len(duration_search(upper_text)) > 0
+    )
+
+
+def create_cache(max_size: int = 100000, db_path: str = None) -> AnalysisCache:
+    """Creates a cache for the `cached_*` functions below, tied to the current patterns and keywords"""
+    return AnalysisCache(version=CACHE_VERSION, max_size=max_size, db_path=db_path)
+
+
+def cached_duration_search(text: str, cache: AnalysisCache) -> list:
+    # durations are matched case-insensitively, so upper-cased text is a safe key
+    return cache.get_or_compute("duration_search", text.upper(), duration_search)
+
+
+def cached_classify_type(text: str, cache: AnalysisCache):
+    # classify_type is case-sensitive, so the text is used as-is
+    return cache.get_or_compute("classify_type", text, classify_type)
+
+
+def cached_find_sentence_types(text: str, cache: AnalysisCache) -> list:
+    return cache.get_or_compute("find_sentence_types", text, find_sentence_types)
+
+
 class RegexAnalyzer(BaseAnalyzer):
-    def __init__(self, sentences):
-        super().__init__(sentences)
-
-    def analyze(self):
-        responses = []
-        for sentence in self.sentences:
-            analysis_response_dict = {}
-            results = duration_search(sentence["text"])
-            classification_results = classify_type(sentence["text"])
-            for key in classification_results:
-                # TODO: for now assuming single result, need to update to handle multiple
-                #  / or case when results is empty
-                analysis_response_dict[key] = results[0]['days']
-            responses.append(
-                AnalysisResponse(
-                    sentence_id=sentence["id"],
-                    **analysis_response_dict).response_data
-            )
-        return responses
+    def __init__(self, sentences=None, workers: int = 1, chunk_size: int = 1000, cache: AnalysisCache = None):
+        super().__init__(sentences, workers=workers, chunk_size=chunk_size)
+        self.cache = cache
+
+    def after_batch(self):
+        if self.cache is not None:
+            self.cache.flush()
+
+    def counters(self) -> dict:
+        return self.cache.counters() if self.cache is not None else {}
+
+    def add_counters(self, counts: dict):
+        if self.cache is not None:
+            self.cache.add_counters(counts)
+
+    def response_fields(self, sentence):
+        analysis_response_dict = {}
+        if self.cache is not None:
+            sentence_types = cached_find_sentence_types(sentence["text"], self.cache)
+        else:
+            sentence_types = find_sentence_types(sentence["text"])
+        # the first mention of each sentence type wins, using the duration closest to it for both min and max for now
+        for hit in sentence_types:
+            if hit["duration"] is None or hit["duration"]["days"] is None:
+                continue
+            for key in hit["response_keys"]:
+                analysis_response_dict.setdefault(key, hit["duration"]["days"])
+        return analysis_response_dict
@@ -0,0 +1,62 @@
+import json
+import re
+
+
+class SentenceTypeMatcher:
+    """Finds every sentence type keyword in a text with a single compiled alternation
+
+    The config maps each sentence type to its `keywords` and the `AnalysisResponse` fields (`response_keys`) it
+    fills, e.g. {"confinement": {"keywords": ["JAIL", "CONF"], "response_keys": [...]}}. Keywords are matched
+    case-sensitively, longest first, and keyword order in the config sets the priority used by `classify`.
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.keywords = []  # (keyword, sentence type) in priority order
+        keyword_types = {}
+        for sentence_type, type_config in config.items():
+            for keyword in type_config["keywords"]:
+                # an empty alternative would match at every position of every text
+                if not keyword:
+                    raise ValueError(f"Empty keyword for sentence type '{sentence_type}'")
+                # priorities are keyed by keyword, a second listing would silently replace the first
+                if keyword in keyword_types:
+                    raise ValueError(
+                        f"Duplicate keyword '{keyword}' for sentence type '{sentence_type}', "
+                        f"already listed for '{keyword_types[keyword]}'"
+                    )
+                keyword_types[keyword] = sentence_type
+                self.keywords.append((keyword, sentence_type))
+        if not self.keywords:
+            raise ValueError("The sentence type config has no keywords")
+        self.priorities = {keyword: index for index, (keyword, _) in enumerate(self.keywords)}
+        ordered = sorted(range(len(self.keywords)), key=lambda index: -len(self.keywords[index][0]))
+        self.pattern = re.compile(
+            "|".join(f"(?P<k{index}>{re.escape(self.keywords[index][0])})" for index in ordered)
+        )
+
+    @classmethod
+    def from_file(cls, config_path: str):
+        with open(config_path) as config_file:
+            return cls(json.load(config_file))
+
+    def search(self, text: str) -> list:
+        """Returns every non-overlapping keyword hit in `text` in order of appearance"""
+        hits = []
+        for match in self.pattern.finditer(text):
+            keyword, sentence_type = self.keywords[int(match.lastgroup[1:])]
+            hits.append({
+                "type": sentence_type,
+                "keyword": keyword,
+                "response_keys": self.config[sentence_type]["response_keys"],
+                "start": match.start(),
+                "end": match.end()
+            })
+        return hits
+
+    def classify(self, text: str):
+        """Response keys of the highest priority keyword found in `text`, or None"""
+        hits = self.search(text)
+        if not hits:
+            return None
+        return min(hits, key=lambda hit: self.priorities[hit["keyword"]])["response_keys"]
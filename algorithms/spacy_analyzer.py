@@ -0,0 +1,131 @@
+import time
+from collections import Counter
+
+from algorithms.analysis_response import AnalysisResponse
+from algorithms.base_analyzer import BaseAnalyzer
+from algorithms.regex_analyzer import duration_search
+from spacy_impl.model_registry import MODEL_REGISTRY
+
+ENTITY_DURATION_FIELDS = {
+    "CONFINEMENT_DURATION": "confinement",
+    "PROBATION_DURATION": "probation"
+}
+MONETARY_PENALTY_LABELS = ["MONETARY_PENALTY", "MONETARY_PENALTY_AMOUNT"]
+
+
+def doc_response_fields(doc) -> dict:
+    """Maps the entities of a processed doc onto `AnalysisResponse` keyword arguments
+
+    Only the first entity of each duration label with a parseable duration is used, for both the minimum and the
+    maximum, as `RegexAnalyzer` uses the first mention of each sentence type; later entities of that label are ignored.
+    """
+    fields = {}
+    for ent in doc.ents:
+        field = ENTITY_DURATION_FIELDS.get(ent.label_)
+        if field is not None and f"minimum_{field}" not in fields:
+            durations = duration_search(ent.text)
+            if durations and durations[0]["days"] is not None:
+                fields[f"minimum_{field}"] = durations[0]["days"]
+                fields[f"maximum_{field}"] = durations[0]["days"]
+                fields[f"{field}_source"] = ent.text
+        elif ent.label_ in MONETARY_PENALTY_LABELS:
+            fields["fines_fees"] = True
+    return fields
+
+
+class SpacyAnalyzer(BaseAnalyzer):
+    """Runs a trained spaCy NER pipeline and converts its entities into `AnalysisResponse` data
+
+    Each chunk goes through a single `nlp.pipe` call. Entity durations are converted to days with `duration_search`.
+    A `model_path` is loaded through the process-wide model registry, so analyzers over the same model share one
+    pipeline, and `exclude` drops components that aren't needed for NER. Worker pools are forked so the workers
+    share that pipeline's weights instead of receiving a pickled copy.
+
+    With a single worker, `analyze_iter` (and so `analyze_file`) streams every sentence through one `nlp.pipe` call
+    over `n_process` processes instead of chunking them, and times each stage.
+
+    Attributes
+    ----------
+    n_process : int
+        `nlp.pipe` processes used by `analyze_iter`
+    stage_seconds : Counter
+        seconds `analyze_iter` spent reading sentences ("read"), in the pipeline ("nlp"), turning entities into
+        responses ("map") and waiting for the caller to consume them ("write")
+    sentences_analyzed : int
+        sentences yielded by `analyze_iter`
+    """
+
+    def __init__(self, sentences=None, model_path: str = None, nlp=None, batch_size: int = 256, workers: int = 1,
+                 chunk_size: int = 1000, exclude: tuple = (), n_process: int = 1):
+        super().__init__(sentences, workers=workers, chunk_size=chunk_size)
+        self.model_path = model_path
+        self.exclude = tuple(exclude)
+        self.nlp = nlp if nlp is not None else MODEL_REGISTRY.get(model_path, exclude=self.exclude)
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.stage_seconds = Counter()
+        self.sentences_analyzed = 0
+
+    def __getstate__(self):
+        # where workers can't be forked, send the path rather than the pipeline and load it once per worker
+        state = self.__dict__.copy()
+        if self.model_path is not None:
+            state["nlp"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.nlp is None:
+            self.nlp = MODEL_REGISTRY.get(self.model_path, exclude=self.exclude)
+
+    def worker_pool(self, initializer, initargs: tuple):
+        return MODEL_REGISTRY.worker_pool(self.workers, initializer, initargs)
+
+    def response_fields(self, sentence):
+        return self.batch_response_fields([sentence])[0]
+
+    def batch_response_fields(self, sentences):
+        docs = self.nlp.pipe((sentence["text"] for sentence in sentences), batch_size=self.batch_size)
+        return [doc_response_fields(doc) for doc in docs]
+
+    def analyze_iter(self, sentences=None):
+        if self.workers > 1:
+            yield from super().analyze_iter(sentences)
+            return
+
+        def timed_texts():
+            read_start = time.perf_counter()
+            for sentence in self.sentences if sentences is None else sentences:
+                self.stage_seconds["read"] += time.perf_counter() - read_start
+                yield sentence["text"], sentence["id"]
+                read_start = time.perf_counter()
+
+        docs = self.nlp.pipe(timed_texts(), as_tuples=True, batch_size=self.batch_size, n_process=self.n_process)
+        while True:
+            # reading happens inside `nlp.pipe`, so its time is taken back out of the pipeline's
+            start, read_seconds = time.perf_counter(), self.stage_seconds["read"]
+            doc, sentence_id = next(docs, (None, None))
+            self.stage_seconds["nlp"] += time.perf_counter() - start - (self.stage_seconds["read"] - read_seconds)
+            if doc is None:
+                return
+            start = time.perf_counter()
+            response = AnalysisResponse(sentence_id=sentence_id, **doc_response_fields(doc)).response_data
+            self.stage_seconds["map"] += time.perf_counter() - start
+            self.sentences_analyzed += 1
+            start = time.perf_counter()
+            yield response
+            self.stage_seconds["write"] += time.perf_counter() - start
+
+    def throughput(self) -> dict:
+        """Seconds and sentences/sec of each `analyze_iter` stage, and overall"""
+        stages = {
+            stage: {"seconds": seconds, "sentences_per_second": self.sentences_analyzed / seconds if seconds else None}
+            for stage, seconds in self.stage_seconds.items()
+        }
+        total = sum(self.stage_seconds.values())
+        return {
+            "sentences": self.sentences_analyzed,
+            "seconds": total,
+            "sentences_per_second": self.sentences_analyzed / total if total else None,
+            "stages": stages
+        }
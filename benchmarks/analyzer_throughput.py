@@ -0,0 +1,39 @@
+import argparse
+import os
+import time
+
+from algorithms.regex_analyzer import RegexAnalyzer
+from utilities.sample_sentences import generate_sentences
+
+
+def time_analyzer(sentences: list, **analyzer_kwargs):
+    start = time.perf_counter()
+    responses = RegexAnalyzer(sentences, **analyzer_kwargs).analyze()
+    elapsed = time.perf_counter() - start
+    return responses, elapsed
+
+
+def compare_throughput(num_sentences: int, workers: int, chunk_size: int):
+    """Runs the serial and process pool paths over the same sentences and checks the output matches"""
+    sentences = generate_sentences(num_sentences)
+    serial_responses, serial_seconds = time_analyzer(sentences)
+    parallel_responses, parallel_seconds = time_analyzer(sentences, workers=workers, chunk_size=chunk_size)
+    assert serial_responses == parallel_responses, "parallel output differs from serial output"
+    return {
+        "sentences": num_sentences,
+        "workers": workers,
+        "chunk_size": chunk_size,
+        "serial_sentences_per_sec": num_sentences / serial_seconds,
+        "parallel_sentences_per_sec": num_sentences / parallel_seconds,
+        "speedup": serial_seconds / parallel_seconds
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare serial and parallel RegexAnalyzer throughput")
+    parser.add_argument("--sentences", type=int, default=200000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+    for key, value in compare_throughput(args.sentences, args.workers, args.chunk_size).items():
+        print(f"{key}: {value}")
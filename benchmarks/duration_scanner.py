@@ -0,0 +1,91 @@
+import argparse
+import random
+import time
+
+from algorithms.regex_analyzer import convert_to_digits, get_durations, scan_durations
+
+DIFFERENTIAL_CORPUS = [
+    "",
+    "NO DURATION HERE",
+    "12 MONTHS JAIL, SUSPENDED",
+    "12 months jail, suspended",
+    "DEFENDANT SENTENCED TO 2 YEARS 6 MONTHS CONFINEMENT",
+    "6 MONTHS 2 YEARS",
+    "3 YEARS PROBATION, 90 DAYS JAIL",
+    "five years suspended sentence and one year probation",
+    "30 DAYS JAIL CREDIT FOR TIME SERVED, FINES AND COSTS $250",
+    "CONFINEMENT 6 MOS 15 DAYS",
+    "1Y 2M 3W 4D 5H",
+    "1 YR - 6 MO & 2 WKS + 3 DAYS AND 4 HRS",
+    "STAND 5 YEARS",
+    "SENTENCE DATE 11/5 2024",
+    "SENTENCE DATE 11 25 MONTHS",
+    "$11 25 FINE",
+    "2024 DAYS",
+    "12 MONTHS JAIL, 12 MONTHS SUSPENDED, 12 MONTHS PROBATION",
+    " - 11 5 ",
+    "365 D, 52 WKS, 12 MOS.",
+    "TWENTY FOUR HOURS; thirty days (suspended)",
+]
+
+FUZZ_TOKENS = [
+    "1", "2", "11", "12", "30", "365", "2024", "$", " ", " ", "  ", "-", ",", "&", "+", "/", "AND", "and",
+    "Y", "YR", "YEARS", "M", "MO", "MONTHS", "W", "WKS", "WEEKS", "D", "DAY", "DAYS", "H", "HRS", "HOURS",
+    "JAIL", "PROBATION", "SUSPENDED", "CONFINEMENT", "CREDIT", ".", "(", ")", ";", "five", "twelve", "ſ", "\t",
+]
+
+
+def generate_fuzz_corpus(num_texts: int, seed: int = 0, max_tokens: int = 40):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(FUZZ_TOKENS) for _ in range(rng.randint(0, max_tokens))) for _ in range(num_texts)]
+
+
+def generate_long_text(num_clauses: int, seed: int = 0):
+    rng = random.Random(seed)
+    clauses = [
+        "THE COURT FINDS THE DEFENDANT GUILTY OF THE CHARGED OFFENSE",
+        "SENTENCED TO 12 MONTHS JAIL, SUSPENDED",
+        "PLACED ON PROBATION FOR 3 YEARS",
+        "CREDIT FOR TIME SERVED OF 45 DAYS",
+        "FINES AND COSTS OF $500 PAYABLE WITHIN 90 DAYS",
+        "CONDITIONS OF RELEASE AS PREVIOUSLY ORDERED BY THE JUDGE",
+    ]
+    return ". ".join(rng.choice(clauses) for _ in range(num_clauses))
+
+
+def check_differential(texts: list):
+    """Returns the texts where the candidate window scanner disagrees with `get_durations`"""
+    mismatches = []
+    for text in texts:
+        text = convert_to_digits(text)
+        if scan_durations(text) != get_durations(text):
+            mismatches.append(text)
+    return mismatches
+
+
+def time_function(function, texts: list, repeats: int):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for text in texts:
+            function(text)
+    return (time.perf_counter() - start) / repeats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check and benchmark scan_durations against get_durations")
+    parser.add_argument("--fuzz-texts", type=int, default=20000)
+    parser.add_argument("--clauses", type=int, default=500)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    mismatches = check_differential(DIFFERENTIAL_CORPUS + generate_fuzz_corpus(args.fuzz_texts))
+    print(f"differential mismatches: {len(mismatches)}")
+    for mismatch in mismatches[:10]:
+        print(f"  {mismatch!r}")
+
+    long_texts = [convert_to_digits(generate_long_text(args.clauses, seed=seed)) for seed in range(10)]
+    get_durations_seconds = time_function(get_durations, long_texts, args.repeats)
+    scan_durations_seconds = time_function(scan_durations, long_texts, args.repeats)
+    print(f"get_durations: {get_durations_seconds:.4f}s")
+    print(f"scan_durations: {scan_durations_seconds:.4f}s")
+    print(f"speedup: {get_durations_seconds / scan_durations_seconds:.1f}x")
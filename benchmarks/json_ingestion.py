@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from dataset_creation.dataset_processing import DatasetProcessor, parse_label_studio_task
+
+LABELS = ["CONFINEMENT", "CONFINEMENT_DURATION", "PROBATION", "PROBATION_DURATION", "MONETARY_PENALTY_AMOUNT"]
+
+
+def write_synthetic_export(path: str, num_tasks: int, seed: int = 0):
+    """Writes a Label Studio style export of `num_tasks` tasks, one task at a time"""
+    rng = random.Random(seed)
+    with open(path, "w") as export_file:
+        export_file.write("[")
+        for i in range(num_tasks):
+            text = f"DEFENDANT {i} SENTENCED TO {rng.randint(1, 24)} MONTHS JAIL, {rng.randint(1, 5)} YEARS PROBATION"
+            results = [
+                {"value": {"start": start, "end": start + 9, "text": text[start:start + 9], "labels": [label]}}
+                for start, label in ((rng.randint(0, 40), rng.choice(LABELS)) for _ in range(rng.randint(0, 4)))
+            ]
+            task = {
+                "data": {"Source": f"source_{rng.randint(0, 9)}", "Data": text},
+                "annotations": [{"result": results}]
+            }
+            export_file.write(("," if i else "") + json.dumps(task))
+        export_file.write("]")
+
+
+def legacy_process_jsons(json_filenames: list, columns: list, mapping_params: dict):
+    """The previous implementation: whole-file json.load and one DataFrame.loc append per task"""
+    merged_json = pd.DataFrame(columns=columns)
+    for json_path in json_filenames:
+        with open(json_path, "r") as json_file:
+            data = json.load(json_file)
+            for task in data:
+                source, text, labels = parse_label_studio_task(task, mapping_params)
+                merged_json.loc[len(merged_json)] = {"Source": source, "Text": text, "label": labels}
+    return merged_json
+
+
+def measure(function, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2 ** 20
+
+
+def streaming_process_jsons(json_filenames: list, columns: list, mapping_params: dict):
+    processor = DatasetProcessor(
+        train_proportion=1.0, csv_filenames=[], json_filenames=json_filenames, csv_transformations={},
+        json_transformations={}, columns=columns, label_list=LABELS, dataset_name="benchmark",
+        annotation_format="LabelStudio", metadata={}, map_labels=mapping_params,
+        ingestion_cache_dir=os.path.join(os.path.dirname(json_filenames[0]), "ingestion_cache"), ingestion_workers=1
+    )
+    return processor.process_jsons()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark DatasetProcessor.process_jsons on a synthetic export")
+    parser.add_argument("--tasks", type=int, default=1000000)
+    parser.add_argument("--legacy-tasks", type=int, default=20000,
+                        help="the legacy path is quadratic, so it runs on a smaller export")
+    args = parser.parse_args()
+    columns = ["Source", "Text", "label"]
+    mapping_params = {"PROBATION": "PROBATION_DURATION"}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for num_tasks, run_legacy in [(args.legacy_tasks, True), (args.tasks, False)]:
+            export_path = os.path.join(directory, f"export_{num_tasks}.json")
+            write_synthetic_export(export_path, num_tasks)
+            print(f"{num_tasks} tasks, {os.path.getsize(export_path) / 2 ** 20:.1f} MiB export")
+            streaming_df, seconds, peak_mib = measure(streaming_process_jsons, [export_path], columns, mapping_params)
+            print(f"  streaming: {seconds:.2f}s, peak {peak_mib:.1f} MiB")
+            if run_legacy:
+                legacy_df, seconds, peak_mib = measure(legacy_process_jsons, [export_path], columns, mapping_params)
+                print(f"  legacy: {seconds:.2f}s, peak {peak_mib:.1f} MiB")
+                assert legacy_df.equals(streaming_df), "streaming output differs from legacy output"
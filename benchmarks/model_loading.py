@@ -0,0 +1,65 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+from spacy_impl.model_registry import ModelRegistry
+
+_forked_nlp = None
+
+
+def private_dirty_mb():
+    """Memory written by this process itself, which for a forked worker includes every page copied from its parent"""
+    try:
+        with open("/proc/self/smaps_rollup") as smaps:
+            for line in smaps:
+                if line.startswith("Private_Dirty:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def _forked_parse(text: str):
+    """Runs in a forked worker, reporting how much of the parent's memory the first call made it copy"""
+    before = private_dirty_mb()
+    start = time.perf_counter()
+    _forked_nlp(text)
+    return time.perf_counter() - start, private_dirty_mb() - before if before is not None else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold and warm model load times through the model registry")
+    parser.add_argument("experiments", nargs="+", help="experiment directories, e.g. experiments/<name>")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--exclude", nargs="*", default=[], help="components to leave out, e.g. tok2vec")
+    parser.add_argument("--memory-budget-mb", type=float, default=None)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    registry = ModelRegistry(max_models=len(args.experiments), memory_budget_mb=args.memory_budget_mb)
+    model_paths = [os.path.join(experiment, "models", "model-best") for experiment in args.experiments]
+    for _ in range(args.repeats):
+        for model_path in model_paths:
+            registry.get(model_path, exclude=args.exclude)
+    report = registry.report()
+
+    print(f"{'':24}{'loads':>7}{'mean s':>10}")
+    for kind in ["cold", "warm"]:
+        mean = report[f"{kind}_mean_seconds"]
+        print(f"{kind:24}{report[f'{kind}_loads']:7}{mean if mean is not None else float('nan'):10.4f}")
+    for loaded in report["loaded"]:
+        print(f"  {loaded['model_path']}: {loaded['size_mb']:.0f} MiB")
+
+    if args.workers > 1:
+        _forked_nlp = registry.get(model_paths[-1], exclude=args.exclude)
+        if "fork" in multiprocessing.get_all_start_methods():
+            with registry.worker_pool(args.workers) as executor:
+                forked = list(executor.map(_forked_parse, ["He was sentenced to 12 months in jail."] * args.workers))
+            report["forked_workers"] = [
+                {"first_call_seconds": seconds, "copied_mb": copied} for seconds, copied in forked
+            ]
+            for seconds, copied in forked:
+                copied = copied if copied is None else round(copied, 1)
+                print(f"forked worker: first call {seconds:.4f}s, {copied} MiB copied")
+    print(json.dumps(report, indent=4))
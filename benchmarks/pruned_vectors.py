@@ -0,0 +1,81 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import spacy
+from spacy.cli.evaluate import evaluate
+from spacy.cli.train import train
+
+import spacy_impl.train  # noqa: F401, registers the readers, batchers and loggers used by config.cfg
+
+
+def measure_load(vectors: str):
+    """Load time and peak RSS growth of loading `vectors`, run in a fresh process"""
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    spacy.load(vectors)
+    seconds = time.perf_counter() - start
+    return seconds, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024
+
+
+def in_fresh_process(function, *args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(function, *args).result()
+
+
+def train_and_evaluate(dataset_path: str, vectors: str, max_steps: int):
+    train_path = os.path.join(dataset_path, "spacy", "train.spacy")
+    test_path = os.path.join(dataset_path, "spacy", "test.spacy")
+    with tempfile.TemporaryDirectory() as output_directory:
+        start = time.perf_counter()
+        train(
+            "spacy_impl/training_config/config.cfg", output_directory,
+            overrides={
+                "paths.train": train_path, "paths.dev": test_path, "paths.vectors": vectors,
+                "training.max_steps": max_steps, "training.eval_frequency": max_steps
+            }
+        )
+        seconds = time.perf_counter() - start
+        scores = evaluate(os.path.join(output_directory, "model-last"), test_path)
+        model_megabytes = sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(os.path.join(output_directory, "model-last")) for name in names
+        ) / 2 ** 20
+    return seconds, scores["ents_f"], model_megabytes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare pruned and full static vectors on a prepared dataset")
+    parser.add_argument(
+        "dataset_path", help="e.g. datasets/<name>, with spacy/train.spacy, spacy/test.spacy and vectors/"
+    )
+    parser.add_argument("--full", default="en_core_web_lg")
+    parser.add_argument("--pruned", default=None, help="defaults to <dataset_path>/vectors")
+    parser.add_argument("--max-steps", type=int, default=500)
+    args = parser.parse_args()
+
+    results = {}
+    for name, vectors in [("full", args.full), ("pruned", args.pruned or os.path.join(args.dataset_path, "vectors"))]:
+        load_seconds, load_rss_mib = in_fresh_process(measure_load, vectors)
+        train_seconds, ents_f, model_mib = train_and_evaluate(args.dataset_path, vectors, args.max_steps)
+        results[name] = {
+            "vectors": vectors,
+            "load_seconds": load_seconds,
+            "load_rss_mib": load_rss_mib,
+            "train_seconds": train_seconds,
+            "steps_per_second": args.max_steps / train_seconds,
+            "ents_f": ents_f,
+            "model_mib": model_mib
+        }
+
+    print(f"{'':8}{'load s':>9}{'load MiB':>10}{'train s':>9}{'steps/s':>9}{'ents_f':>8}{'model MiB':>11}")
+    for name, result in results.items():
+        print(f"{name:8}{result['load_seconds']:9.2f}{result['load_rss_mib']:10.0f}{result['train_seconds']:9.1f}"
+              f"{result['steps_per_second']:9.2f}{result['ents_f']:8.3f}{result['model_mib']:11.1f}")
+    with open(os.path.join(args.dataset_path, "vectors_comparison.json"), "w") as results_file:
+        json.dump(results, results_file, indent=4)
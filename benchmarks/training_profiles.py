@@ -0,0 +1,52 @@
+import argparse
+import os
+import tempfile
+
+import spacy
+from spacy.tokens import DocBin
+from spacy.training.corpus import walk_corpus
+
+from spacy_impl.train import train_model
+from spacy_impl.training_profiles import load_profile
+
+
+def padding_overhead(corpus_path: str, batcher_name: str, batch_size: dict) -> float:
+    """Padded words over real words for one pass of a batcher over the corpus"""
+    nlp = spacy.blank("en")
+    lengths = [len(doc) for shard in walk_corpus(corpus_path, ".spacy")
+               for doc in DocBin().from_disk(shard).get_docs(nlp.vocab)]
+    size = spacy.registry.schedules.get("compounding.v1")(**batch_size)
+    batcher = spacy.registry.batchers.get(batcher_name)(size=size, tolerance=0.2, discard_oversize=False)
+    batches = list(batcher([[None] * length for length in lengths]))
+    return sum(max(map(len, batch)) * len(batch) for batch in batches) / sum(lengths)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train with each training profile and compare words/sec")
+    parser.add_argument("dataset_path", help="e.g. datasets/<name>, with spacy/train.spacy")
+    parser.add_argument("--profiles", nargs="+", default=["default", "bucketed", "quick"])
+    parser.add_argument("--max-seconds", type=float, default=300, help="budget per profile, overrides the profile")
+    parser.add_argument("--eval-frequency", type=int, default=20,
+                        help="words/sec is measured at evaluations, so evaluate often enough to see several")
+    parser.add_argument("--vectors", default=None)
+    args = parser.parse_args()
+
+    results = {}
+    for profile in args.profiles:
+        settings = load_profile(profile)
+        with tempfile.TemporaryDirectory() as experiment_path:
+            throughput = train_model(
+                args.dataset_path, experiment_path, vectors=args.vectors, profile=profile, max_seconds=args.max_seconds,
+                eval_frequency=args.eval_frequency
+            )
+        results[profile] = {
+            "words_per_second": throughput["words_per_second"],
+            "steps": throughput["steps"],
+            "padding": padding_overhead(
+                os.path.join(args.dataset_path, "spacy", "train.spacy"), settings["batcher"], settings["batch_size"]
+            )
+        }
+
+    print(f"{'profile':12}{'words/sec':>12}{'steps':>8}{'padded/real':>13}")
+    for profile, result in results.items():
+        print(f"{profile:12}{result['words_per_second']:12.0f}{result['steps']:8}{result['padding']:13.3f}")
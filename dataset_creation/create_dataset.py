@@ -1,7 +1,14 @@
+import json
 import os
+import numpy as np
 import pandas as pd
 
-from utilities.utils import is_label_present
+from dataset_creation.dataset_processing import DatasetProcessor
+from dataset_creation.index_splits import (
+    generate_iterative_splits, generate_splits, stratum_codes, write_split_manifest
+)
+from utilities.annotation_conversions import SpanTable, full_table_paths, span_table_paths
+from utilities.utils import label_bitmask, label_presence_matrix, label_summary
 
 
 class BaseDatasetCreation:
@@ -33,6 +40,55 @@ class BaseDatasetCreation:
     def generate_training_test_sets(self):
         raise NotImplementedError
 
+    def split_params(self):
+        """Seed and fold parameters shared by all methods; an unset seed is drawn once and recorded"""
+        assert self.train_proportion <= 1.0, \
+            f"Train proportion must be less than or equal to 1.0. It is {self.train_proportion}"
+        seed = self.dataset_params.get("seed")
+        if seed is None:
+            seed = int(np.random.SeedSequence().entropy % 2 ** 32)
+        return {
+            "seed": seed,
+            "n_folds": self.dataset_params.get("n_folds", 0),
+            "n_repeats": self.dataset_params.get("n_repeats", 1)
+        }
+
+    def write_splits(self, splits: dict, **params):
+        """Writes the full dataset once as a span table plus the splits.json manifest of doc ids into it
+
+        Consumers read a split with `SpanTable.load_split`. With the `write_split_files` dataset parameter the first
+        split is also written out as train_df.csv/test_df.csv and their span tables, for tools that still read those.
+        """
+        dataset_path = os.path.join("datasets/", self.dataset_name)
+        if not os.path.exists(dataset_path):
+            os.makedirs(dataset_path)
+        SpanTable.from_label_lists(self.full_df).to_parquet(*full_table_paths(dataset_path))
+        write_split_manifest(
+            os.path.join(dataset_path, "splits.json"), self.full_df.index, splits,
+            train_proportion=self.train_proportion, **params
+        )
+        self.metadata["seed"] = params["seed"]
+        self.metadata["splits"] = {
+            name: {"train": len(train), "test": len(test)} for name, (train, test) in splits.items()
+        }
+
+        train_positions, test_positions = next(iter(splits.values()))
+        training_data = self.full_df.iloc[train_positions]
+        test_data = self.full_df.iloc[test_positions]
+        self.metadata["train"]["size"] = len(training_data)
+        self.metadata["train"].update(label_summary(training_data))
+        self.metadata["test"]["size"] = len(test_data)
+        self.metadata["test"].update(label_summary(test_data))
+
+        if self.dataset_params.get("write_split_files"):
+            for data, name in [(training_data, "train_df.csv"), (test_data, "test_df.csv")]:
+                data.to_csv(os.path.join(dataset_path, name))
+                SpanTable.from_label_lists(data).to_parquet(*span_table_paths(os.path.join(dataset_path, name)))
+
+    def stratify_columns(self) -> list:
+        stratify_columns = self.dataset_params.get("stratify_column") or []
+        return [stratify_columns] if isinstance(stratify_columns, str) else list(stratify_columns)
+
 
 class StratifiedSample(BaseDatasetCreation):
     """Strategy to equally represent different sources in training and test datasets
@@ -41,34 +97,85 @@ class StratifiedSample(BaseDatasetCreation):
     -------
     generate_training_test_sets()
         Divides the pool of data in the specified proportions into training and test, equally stratified by the
-        `stratify` column parameter to represent those instances equally in training and test.
+        `stratify_column` parameter (one column or a list of columns) to represent those instances equally in
+        training and test. `seed` makes the split reproducible, `n_folds` > 1 generates K folds instead of a single
+        split and `n_repeats` repeats the whole procedure; all splits are written to `splits.json` as doc ids.
 
     """
 
     def generate_training_test_sets(self):
-        stratify_column = self.dataset_params.get("stratify_column")  # TODO: allow for multiple columns?
-
-        assert self.train_proportion <= 1.0, \
-            f"Train proportion must be less than or equal to 1.0. It is {self.train_proportion}"
-        if stratify_column == "label":
+        stratify_columns = self.stratify_columns()
+        strata = self.full_df[[column for column in stratify_columns if column != "label"]]
+        if "label" in stratify_columns:
             print("stratifying by label")
-            all_labels = self.dataset_params.get("label_list")
-            stratify_column = []
-            for label in all_labels:
-                column_name = f"{label}_present"
-                self.full_df[column_name] = self.full_df.apply(
-                    lambda x: is_label_present(x["label"], label), axis=1
-                )
-                stratify_column.append(column_name)
-        training_data = self.full_df.groupby(stratify_column, group_keys=False).apply(
-            lambda x: x.sample(frac=self.train_proportion)
+            # one stratum per combination of present labels
+            matrix = label_presence_matrix(self.full_df, self.dataset_params.get("label_list"))
+            strata = strata.assign(label_bitmask=label_bitmask(matrix))
+
+        params = self.split_params()
+        splits = generate_splits(
+            stratum_codes(strata, list(strata.columns)), self.train_proportion, params["seed"], params["n_folds"],
+            params["n_repeats"]
         )
-        self.metadata["train"]["size"] = len(training_data)
-        test_data = self.full_df[~self.full_df.isin(training_data)].dropna()
-        self.metadata["test"]["size"] = len(test_data)
-        dataset_path = os.path.join("datasets/", self.dataset_name)
-        if not os.path.exists(dataset_path):
-            os.makedirs(dataset_path)
+        self.write_splits(splits, stratify_columns=stratify_columns, method="StratifiedSample", **params)
+
+
+class IterativeStratification(BaseDatasetCreation):
+    """Strategy to keep every label's train/test ratio close to the train proportion, including rare labels
+
+    Methods
+    -------
+    generate_training_test_sets()
+        Splits with `iterative_stratification` over the presence matrix of `label_list`. Any other `stratify_column`
+        is one-hot encoded and balanced alongside the labels. Takes the same `seed`, `n_folds` and `n_repeats`
+        parameters as `StratifiedSample`.
+
+    """
+
+    def generate_training_test_sets(self):
+        stratify_columns = [column for column in self.stratify_columns() if column != "label"]
+        matrix = label_presence_matrix(self.full_df, self.dataset_params.get("label_list"))
+        if stratify_columns:
+            codes = stratum_codes(self.full_df, stratify_columns)
+            matrix = np.hstack([matrix, codes[:, None] == np.arange(codes.max() + 1)])
+
+        params = self.split_params()
+        splits = generate_iterative_splits(
+            matrix, self.train_proportion, params["seed"], params["n_folds"], params["n_repeats"]
+        )
+        self.write_splits(splits, stratify_columns=stratify_columns, method="IterativeStratification", **params)
+
 
-        training_data.to_csv(os.path.join(dataset_path, "train_df.csv"))
-        test_data.to_csv(os.path.join(dataset_path, "test_df.csv"))
+def create_dataset(dataset_config: dict, creation_method: str) -> str:
+    """Processes the raw data and writes the training and test sets with `creation_method`, returns the dataset path"""
+    dataset_creation_methods = {cls.__name__: cls for cls in BaseDatasetCreation.__subclasses__()}
+    dataset_path = os.path.join("datasets", dataset_config["dataset_name"])
+    dataset_metadata = {
+        "label_counts": {},
+        "train": {
+            "sources": {},
+            "label_counts": {}
+        },
+        "test": {
+            "sources": {},
+            "label_counts": {}
+        }
+    }
+    processor = DatasetProcessor(
+        **dataset_config,
+        annotation_format="LabelStudio",
+        metadata=dataset_metadata
+    )
+    dataset = processor.get_full_dataset()
+    creator = dataset_creation_methods[creation_method](
+        full_df=dataset,
+        annotation_format="LabelStudio",
+        metadata=dataset_metadata,
+        **dataset_config
+    )
+    creator.generate_training_test_sets()
+    dataset_metadata = os.path.join(dataset_path, "metadata.json")
+    dataset_config.update(creator.metadata)
+    with open(dataset_metadata, "w") as outfile:
+        json.dump(dataset_config, outfile, indent=4)
+    return dataset_path
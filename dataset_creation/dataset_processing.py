@@ -1,9 +1,49 @@
-import json
-import statistics
-
 import pandas as pd
 import utilities.annotation_conversions as label_conversions
-from utilities.utils import filter_labels
+from dataset_creation.ingestion_cache import ingest_files
+from utilities.record_io import iter_json_array
+from utilities.utils import explode_labels, filter_labels, label_summary, to_metadata_key
+
+
+def parse_label_studio_task(task: dict, mapping_params: dict):
+    """Returns the source, text and labels of one task from a Label Studio JSON export"""
+    row_metadata = task["data"]
+    text = row_metadata["Data"]
+    labels = []
+    for annotation in task["annotations"]:
+        for result in annotation["result"]:
+            if "value" in result.keys():
+                label_info = result["value"]
+                label_value = label_info["labels"][0]
+                labels.append(
+                    {
+                        "start": label_info["start"],
+                        "end": label_info["end"],
+                        "text": text,
+                        "labels": [mapping_params.get(label_value, label_value)]
+                    }
+                )
+    return row_metadata["Source"], text, labels
+
+
+def load_csv(csv_path: str, columns: list, annotation_format: str, label_mappings: dict):
+    """Reads one raw CSV and parses its labels"""
+    df = pd.read_csv(csv_path, usecols=columns, header=0)
+    conversion_pipeline = getattr(label_conversions, annotation_format)(df)
+    conversion_pipeline.load_labels(label_mappings=label_mappings)
+    return conversion_pipeline.entities
+
+
+def load_label_studio_json(json_path: str, columns: list, mapping_params: dict):
+    """Reads one Label Studio JSON export task by task"""
+    # accumulate plain lists and build the frame once, appending rows one at a time is quadratic
+    rows = {"Source": [], "Text": [], "label": []}
+    for task in iter_json_array(json_path):
+        source, text, labels = parse_label_studio_task(task, mapping_params)
+        rows["Source"].append(source)
+        rows["Text"].append(text)
+        rows["label"].append(labels)
+    return pd.DataFrame(rows, columns=columns)
 
 
 class DatasetProcessor:
@@ -32,6 +72,8 @@ class DatasetProcessor:
         self.annotation_format = annotation_format
         self.dataset_params = kwargs
         self.metadata = metadata
+        self.ingestion_cache_dir = kwargs.get("ingestion_cache_dir", "datasets/.ingestion_cache")
+        self.ingestion_workers = kwargs.get("ingestion_workers")
 
     def get_full_dataset(self):
         df_from_csvs = self.process_csvs()
@@ -42,73 +84,42 @@ class DatasetProcessor:
         return full_df
 
     def get_label_counts(self, df):
-        label_stats = {"num_labels": [], "label_statistics": {}}
-        summary_statistics = {}
-        for index, row in df.iterrows():
-            labels = row["label"]
-            overall_counts = len(labels)
-            all_labels = [label["labels"][0] if label["labels"] else None for label in labels]
+        labels_per_row = df["label"].str.len()
+        label_table = explode_labels(df)
+        instances_per_row = label_table.groupby(["label", "row_id"], dropna=False).size()
+        label_statistics = instances_per_row.groupby(level="label", dropna=False).agg(["size", "max"])
 
-            unique_labels = set(all_labels)
-            label_counts = {item: all_labels.count(item) for item in unique_labels}
-            for key, value in label_counts.items():
-                if key in label_stats["label_statistics"].keys():
-                    label_stats["label_statistics"][key].append(value)
-                else:
-                    label_stats["label_statistics"][key] = [value]
-            label_stats["num_labels"].append(overall_counts)
-        summary_statistics["max_labels_per_row"] = max(label_stats["num_labels"])
-        summary_statistics["avg_labels_per_row"] = statistics.mean(label_stats["num_labels"])
-        summary_statistics["med_labels_per_row"] = statistics.median(label_stats["num_labels"])
-        for label, values in label_stats["label_statistics"].items():
-            summary_statistics[label] = {}
-            summary_statistics[label]["rows_with_label"] = len(values)
-            summary_statistics[label]["max_instances_per_row"] = max(values)
+        summary_statistics = {
+            "max_labels_per_row": int(labels_per_row.max()),
+            "avg_labels_per_row": float(labels_per_row.mean()),
+            "med_labels_per_row": float(labels_per_row.median())
+        }
+        for label, values in label_statistics.iterrows():
+            summary_statistics[to_metadata_key(label)] = {
+                "rows_with_label": int(values["size"]),
+                "max_instances_per_row": int(values["max"])
+            }
+        summary_statistics.update(label_summary(df))
         self.metadata.update(summary_statistics)
 
     def process_csvs(self):
-        df = pd.concat(
-            [
-                pd.read_csv(csv, usecols=self.columns, header=0) for csv in self.csv_filenames
-            ],
-            ignore_index=True, join='inner'
-        )
         self.metadata["num_csvs"] = len(self.csv_filenames)  # metadata for number of csvs
-        conversion_pipeline = getattr(label_conversions, self.annotation_format)(df)
-        conversion_pipeline.load_labels(
-            label_mappings=self.csv_transformations.get("map_labels")
+        frames = ingest_files(
+            self.csv_filenames, load_csv,
+            (self.columns, self.annotation_format, self.csv_transformations.get("map_labels")),
+            cache_dir=self.ingestion_cache_dir, workers=self.ingestion_workers
         )
-        return conversion_pipeline.entities
+        if not frames:
+            return pd.DataFrame(columns=self.columns)
+        return pd.concat(frames, ignore_index=True, join='inner')
 
     def process_jsons(self):
         mapping_params = self.dataset_params.get("map_labels", {})
-        merged_json = pd.DataFrame(columns=self.columns)
         self.metadata["num_jsons"] = len(self.json_filenames)  # metadata for number of csvs
-        for json_path in self.json_filenames:
-            with open(json_path, 'r') as json_file:
-                data = json.load(json_file)
-                for i in range(len(data)):
-                    row_metadata = data[i]["data"]
-                    row = {"Source": row_metadata["Source"], "Text": row_metadata["Data"], "label": []}
-                    text = row_metadata["Data"]
-                    for j in range(len(data[i]["annotations"])):
-                        annotations = data[i]["annotations"][j]["result"]
-                        for k in range(len(annotations)):
-                            if "value" in annotations[k].keys():
-                                label_info = annotations[k]["value"]
-                                labels = label_info["labels"]
-                                label_value = label_info["labels"][0]
-
-                                if label_value in mapping_params.keys():
-                                    labels = [mapping_params.get(label_value)]
-                                label_value = labels[0]
-                                row["label"].append(
-                                    {
-                                        "start": label_info["start"],
-                                        "end": label_info["end"],
-                                        "text": text,
-                                        "labels": [label_value]
-                                    }
-                                )
-                    merged_json.loc[len(merged_json)] = row
-        return merged_json
+        frames = ingest_files(
+            self.json_filenames, load_label_studio_json, (self.columns, mapping_params),
+            cache_dir=self.ingestion_cache_dir, workers=self.ingestion_workers
+        )
+        if not frames:
+            return pd.DataFrame(columns=self.columns)
+        return pd.concat(frames, ignore_index=True)
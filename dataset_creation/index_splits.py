@@ -0,0 +1,145 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+
+def stratum_codes(df: pd.DataFrame, columns: list) -> np.ndarray:
+    """One integer code per row identifying its combination of values in `columns`, NaN counted as its own value"""
+    if not columns:
+        return np.zeros(len(df), dtype=np.int64)
+    return df.groupby(columns, sort=False, dropna=False).ngroup().to_numpy(dtype=np.int64)
+
+
+def _shuffled_strata(codes: np.ndarray, rng: np.random.Generator):
+    """Row positions shuffled within each stratum and grouped by stratum, with the stratum sizes"""
+    order = rng.permutation(len(codes))
+    order = order[np.argsort(codes[order], kind="stable")]
+    return order, np.bincount(codes)
+
+
+def stratified_split(codes: np.ndarray, train_proportion: float, rng: np.random.Generator):
+    """Sorted train and test row positions with `train_proportion` of every stratum in train
+
+    Each stratum gets the floor of its share and the rows left over by rounding go to the strata with the largest
+    remainders, so the train size is exactly `round(len(codes) * train_proportion)`.
+    """
+    order, counts = _shuffled_strata(codes, rng)
+    shares = counts * train_proportion
+    train_counts = np.floor(shares).astype(np.int64)
+    leftover = int(round(len(codes) * train_proportion)) - train_counts.sum()
+    if leftover > 0:
+        train_counts[np.argsort(train_counts - shares, kind="stable")[:leftover]] += 1
+    starts = np.cumsum(counts) - counts
+    rank = np.arange(len(codes)) - np.repeat(starts, counts)
+    in_train = rank < np.repeat(train_counts, counts)
+    return np.sort(order[in_train]), np.sort(order[~in_train])
+
+
+def stratified_folds(codes: np.ndarray, n_folds: int, rng: np.random.Generator) -> np.ndarray:
+    """Fold number of every row; fold sizes differ by at most one overall and within each stratum"""
+    order, _ = _shuffled_strata(codes, rng)
+    folds = np.empty(len(codes), dtype=np.int64)
+    folds[order] = np.arange(len(codes)) % n_folds
+    return folds
+
+
+def _largest_remainder(shares: np.ndarray, total: int) -> np.ndarray:
+    """Integer counts summing to `total`, proportional to the non-negative `shares`"""
+    exact = shares * (total / shares.sum())
+    counts = np.floor(exact).astype(np.int64)
+    leftover = total - counts.sum()
+    counts[np.argsort(counts - exact, kind="stable")[:leftover]] += 1
+    return counts
+
+
+def iterative_stratification(matrix: np.ndarray, proportions, rng: np.random.Generator) -> np.ndarray:
+    """Subset number of every row of a boolean (rows x labels) presence matrix, for subsets of the given proportions
+
+    Batched iterative stratification (Sechidis et al., 2011): labels are handled from the rarest to the most common
+    among the rows still unassigned, and all of a label's rows are dealt out at once in proportion to how many of
+    that label each subset still lacks. Rare labels are therefore placed first, while every subset can still take
+    them, and rows without any label fill the remaining subset sizes last.
+    """
+    proportions = np.asarray(proportions, dtype=np.float64)
+    subsets = np.full(len(matrix), -1, dtype=np.int64)
+    desired_labels = np.outer(proportions, matrix.sum(axis=0))
+    desired_sizes = proportions * len(matrix)
+    unassigned = np.ones(len(matrix), dtype=bool)
+    while True:
+        label_counts = matrix[unassigned].sum(axis=0)
+        if not label_counts.any():
+            break
+        label = np.flatnonzero(label_counts == label_counts[label_counts > 0].min())[0]
+        rows = rng.permutation(np.flatnonzero(unassigned & matrix[:, label]))
+        lacking = np.clip(desired_labels[:, label], 0, None)
+        if not lacking.any():
+            lacking = np.clip(desired_sizes, 0, None)
+        for subset, subset_rows in enumerate(np.split(rows, np.cumsum(_largest_remainder(lacking, len(rows)))[:-1])):
+            subsets[subset_rows] = subset
+            desired_labels[subset] -= matrix[subset_rows].sum(axis=0)
+            desired_sizes[subset] -= len(subset_rows)
+        unassigned[rows] = False
+
+    rows = rng.permutation(np.flatnonzero(unassigned))
+    if len(rows):
+        lacking = np.clip(desired_sizes, 0, None)
+        lacking = lacking if lacking.any() else proportions
+        for subset, subset_rows in enumerate(np.split(rows, np.cumsum(_largest_remainder(lacking, len(rows)))[:-1])):
+            subsets[subset_rows] = subset
+    return subsets
+
+
+def generate_iterative_splits(matrix: np.ndarray, train_proportion: float, seed: int, n_folds: int = 0,
+                              n_repeats: int = 1):
+    """Same splits and names as `generate_splits`, assigned with `iterative_stratification` on a presence matrix"""
+    rng = np.random.default_rng(seed)
+    splits = {}
+    for repeat in range(n_repeats):
+        prefix = f"repeat_{repeat}_" if n_repeats > 1 else ""
+        if n_folds > 1:
+            folds = iterative_stratification(matrix, np.full(n_folds, 1 / n_folds), rng)
+            for fold in range(n_folds):
+                splits[f"{prefix}fold_{fold}"] = np.flatnonzero(folds != fold), np.flatnonzero(folds == fold)
+        else:
+            subsets = iterative_stratification(matrix, [train_proportion, 1 - train_proportion], rng)
+            splits[f"{prefix}split_0"] = np.flatnonzero(subsets == 0), np.flatnonzero(subsets == 1)
+    return splits
+
+
+def generate_splits(codes: np.ndarray, train_proportion: float, seed: int, n_folds: int = 0, n_repeats: int = 1):
+    """Returns {name: (train positions, test positions)} for every split, all drawn from one seeded generator
+
+    With `n_folds` > 1 each repeat is a K-fold partition (split names `fold_{k}`), otherwise a single
+    `train_proportion` split (`split_0`). Repeats are prefixed with `repeat_{r}_` when `n_repeats` > 1.
+    """
+    rng = np.random.default_rng(seed)
+    splits = {}
+    for repeat in range(n_repeats):
+        prefix = f"repeat_{repeat}_" if n_repeats > 1 else ""
+        if n_folds > 1:
+            folds = stratified_folds(codes, n_folds, rng)
+            for fold in range(n_folds):
+                splits[f"{prefix}fold_{fold}"] = np.flatnonzero(folds != fold), np.flatnonzero(folds == fold)
+        else:
+            splits[f"{prefix}split_0"] = stratified_split(codes, train_proportion, rng)
+    return splits
+
+
+def write_split_manifest(path: str, doc_ids, splits: dict, **params):
+    """Stores each split as the doc ids of its train and test rows, together with the parameters that produced it"""
+    doc_ids = np.asarray(doc_ids)
+    manifest = {
+        **params,
+        "splits": {
+            name: {"train": doc_ids[train].tolist(), "test": doc_ids[test].tolist()}
+            for name, (train, test) in splits.items()
+        }
+    }
+    with open(path, "w") as manifest_file:
+        json.dump(manifest, manifest_file)
+
+
+def read_split_manifest(path: str) -> dict:
+    with open(path) as manifest_file:
+        return json.load(manifest_file)
@@ -0,0 +1,61 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import pandas as pd
+
+# bump whenever the loaders change what they produce for the same input
+INGESTION_VERSION = 3
+
+
+def file_content_hash(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as input_file:
+        while block := input_file.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def ingestion_cache_key(path: str, loader, loader_args: tuple) -> str:
+    """Hash of the file content together with the loader and every argument that shapes its output"""
+    config = json.dumps([INGESTION_VERSION, loader.__name__, loader_args], sort_keys=True, default=str)
+    return hashlib.sha256(f"{file_content_hash(path)}:{config}".encode()).hexdigest()
+
+
+def write_cached_frame(frame: pd.DataFrame, cache_path: str):
+    # labels are lists of dicts with varying keys, JSON keeps them exactly as loaded
+    frame.assign(label=frame["label"].map(json.dumps)).to_parquet(f"{cache_path}.tmp", index=False)
+    os.replace(f"{cache_path}.tmp", cache_path)
+
+
+def read_cached_frame(cache_path: str) -> pd.DataFrame:
+    frame = pd.read_parquet(cache_path)
+    frame["label"] = frame["label"].map(json.loads)
+    return frame
+
+
+def ingest_files(paths: list, loader, loader_args: tuple, cache_dir: str, workers: int = None) -> list:
+    """Returns `loader(path, *loader_args)` for every path, in order
+
+    Results are cached as Parquet in `cache_dir` under `ingestion_cache_key`, so unchanged files are read back
+    instead of being parsed again. Files missing from the cache are loaded in parallel over a process pool.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_paths = {path: os.path.join(cache_dir, f"{ingestion_cache_key(path, loader, loader_args)}.parquet")
+                   for path in paths}
+    frames = {path: read_cached_frame(cache_paths[path]) for path in paths if os.path.exists(cache_paths[path])}
+    uncached = [path for path in paths if path not in frames]
+    print(f"ingestion cache: {len(frames)} cached, {len(uncached)} to process")
+
+    workers = min(workers or os.cpu_count(), len(uncached))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            loaded = list(executor.map(loader, uncached, *[repeat(arg) for arg in loader_args]))
+    else:
+        loaded = [loader(path, *loader_args) for path in uncached]
+    for path, frame in zip(uncached, loaded):
+        write_cached_frame(frame, cache_paths[path])
+        frames[path] = frame
+    return [frames[path] for path in paths]
@@ -5,9 +5,9 @@ from inquirer import errors
 
 from spacy_impl.dataset_preparation import prepare_datasets
 from utilities.annotation_conversions import BaseFormat
-from dataset_creation.create_dataset import BaseDatasetCreation, StratifiedSample
-from dataset_creation.dataset_processing import DatasetProcessor
+from dataset_creation.create_dataset import BaseDatasetCreation, create_dataset
 from spacy_impl.train import train_model
+from spacy_impl.vectors import build_pruned_vectors, training_corpus
 from spacy_impl.evaluate import evaluate
 
 
@@ -48,7 +48,8 @@ def use_existing_datasets_qs():
 
     experiment_location_questions = [
         inquirer.List("dataset_name", message="Please select the dataset you'd like to use",
-                      choices=[d for d in os.listdir(dataset_directory)], validate=validate_experiment_path)
+                      choices=[d for d in os.listdir(dataset_directory) if not d.startswith(".")],
+                      validate=validate_experiment_path)
     ]
     dataset_name = inquirer.prompt(experiment_location_questions)["dataset_name"]
     return os.path.join(dataset_directory, dataset_name)
@@ -118,7 +119,7 @@ def prepare_dataset_qs():
 
 
 def create_experiment_directories(experiment_path):
-    [os.makedirs(os.path.join(experiment_path, folder)) for folder in ["models", "results"]]
+    [os.makedirs(os.path.join(experiment_path, folder), exist_ok=True) for folder in ["models", "results"]]
 
 
 def end_to_end():
@@ -129,7 +130,8 @@ def end_to_end():
     if experiment_data["dataset_creation"] == "use existing":
         dataset_path = use_existing_datasets_qs()
     else:
-        dataset_creation_options = [cls.__name__ for cls in BaseDatasetCreation.__subclasses__()]
+        dataset_creation_methods = {cls.__name__: cls for cls in BaseDatasetCreation.__subclasses__()}
+        dataset_creation_options = list(dataset_creation_methods)
         questions = [
             inquirer.List('dataset_creation_method',
                           message="Select a method to create your dataset from the available methods",
@@ -137,52 +139,18 @@ def end_to_end():
                           ),
         ]
         answers = inquirer.prompt(questions)
-        if answers["dataset_creation_method"] == "StratifiedSample":
+        if answers["dataset_creation_method"] in ["StratifiedSample", "IterativeStratification"]:
             sample_config = stratified_sample_creation_qs()
-            dataset_path = os.path.join("datasets", sample_config["dataset_name"])
             dataset_config = load_default_config('dataset_creation/dataset_creation_config.json')
             dataset_config.update(sample_config)
-            dataset_metadata = {
-                "label_counts": {},
-                "train": {
-                    "sources": {},
-                    "label_counts": {}
-                },
-                "test": {
-                    "sources": {},
-                    "label_counts": {}
-                }
-            }
-            processor = DatasetProcessor(
-                **dataset_config,
-                annotation_format="LabelStudio",
-                metadata=dataset_metadata
-            )
-            dataset = processor.get_full_dataset()
-            creator = StratifiedSample(
-                full_df=dataset,
-                annotation_format="LabelStudio",
-                metadata=dataset_metadata,
-                **dataset_config
-            )
-            creator.generate_training_test_sets()
-            dataset_metadata = os.path.join(dataset_path, "metadata.json")
-            dataset_config.update(creator.metadata)
-            with open(dataset_metadata, "w") as outfile:
-                json.dump(dataset_config, outfile, indent=4)
+            dataset_path = create_dataset(dataset_config, answers["dataset_creation_method"])
             # prepare datasets for spaCy
             dataset_preparation_config = prepare_dataset_qs()
-            dataset_preparation_config["dataset_config"] = [
-                {
-                    "dataset_path": os.path.join(dataset_path, "train_df.csv"),
-                    "output_path": os.path.join(dataset_path, "spacy", "train.spacy")
-                },
-                {
-                    "dataset_path": os.path.join(dataset_path, "test_df.csv"),
-                    "output_path": os.path.join(dataset_path, "spacy", "test.spacy")
-                }
-            ]
-            prepare_datasets.prepare_datasets_for_model(**dataset_preparation_config)
+            dataset_preparation_config["dataset_config"] = prepare_datasets.spacy_dataset_config(dataset_path)
+            prepare_datasets.prepare_datasets_for_model(
+                **dataset_preparation_config, workers=None, cache_dir=prepare_datasets.CONVERSION_CACHE_DIR
+            )
+            build_pruned_vectors([training_corpus(dataset_path)], os.path.join(dataset_path, "vectors"))
         else:
             raise NotImplementedError
 
@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+
+from dataset_creation.create_dataset import create_dataset
+from spacy_impl.dataset_preparation.prepare_datasets import convert_dataset, spacy_dataset_config
+from spacy_impl.evaluate import evaluate
+from spacy_impl.train import train_model
+from spacy_impl.training_profiles import PROFILES_PATH
+from spacy_impl.vectors import build_pruned_vectors
+from utilities.annotation_conversions import full_table_paths
+from utilities.stage_graph import Stage, StageGraph
+
+TRAINING_CONFIG_PATH = "spacy_impl/training_config/config.cfg"
+
+
+def conversion_inputs(entry: dict) -> list:
+    """Files a `spacy_dataset_config` entry is converted from"""
+    if "split" in entry:
+        return [*full_table_paths(entry["dataset_path"]), os.path.join(entry["dataset_path"], "splits.json")]
+    return [entry["dataset_path"]]
+
+
+def experiment_stages(spec: dict) -> list:
+    """The stages of an experiment spec: dataset creation, train and test conversion, vectors, training, evaluation
+
+    With "dataset" in the spec the dataset is created from raw data with those settings on top of
+    dataset_creation_config.json, otherwise the existing dataset at "dataset_path" is used. "split" picks the split
+    of the dataset's splits.json to train and test on, the first one by default, and "conversion_cache_dir" turns
+    on the conversion cache of `prepare_datasets_for_model`.
+    """
+    experiment_path = os.path.join("experiments", spec["experiment_name"])
+    stages = []
+    if "dataset" in spec:
+        with open("dataset_creation/dataset_creation_config.json") as config_file:
+            dataset_config = json.load(config_file)
+        dataset_config.update(spec["dataset"])
+        creation_method = dataset_config.pop("creation_method", "StratifiedSample")
+        dataset_path = os.path.join("datasets", dataset_config["dataset_name"])
+        stages.append(Stage(
+            "create_dataset", create_dataset,
+            params={"dataset_config": dataset_config, "creation_method": creation_method},
+            inputs=dataset_config["csv_filenames"] + dataset_config["json_filenames"],
+            outputs=[*full_table_paths(dataset_path), os.path.join(dataset_path, "splits.json"),
+                     os.path.join(dataset_path, "metadata.json")]
+        ))
+    else:
+        dataset_path = spec["dataset_path"]
+
+    # "conversion_workers" (one per CPU by default) is shared by the train and test conversions, which run at the
+    # same time when the graph has room for both
+    concurrent_conversions = min(2, spec.get("max_workers", 2))
+    conversion_workers = max(1, (spec.get("conversion_workers") or os.cpu_count()) // concurrent_conversions)
+    for entry, part in zip(spacy_dataset_config(dataset_path, spec.get("split")), ["train", "test"]):
+        stages.append(Stage(
+            f"convert_{part}", convert_dataset,
+            params={**entry, "annotation_format": spec.get("annotation_format", "LabelStudio"),
+                    "workers": conversion_workers, "cache_dir": spec.get("conversion_cache_dir")},
+            inputs=conversion_inputs(entry), outputs=[entry["output_path"]]
+        ))
+    train_path = os.path.join(dataset_path, "spacy", "train.spacy")
+    test_path = os.path.join(dataset_path, "spacy", "test.spacy")
+
+    training_inputs = [train_path, TRAINING_CONFIG_PATH, PROFILES_PATH]
+    if spec.get("vectors") is not None:
+        vectors_path = os.path.join(dataset_path, "vectors")
+        stages.append(Stage(
+            "vectors", build_pruned_vectors,
+            # from the training corpus only, so test words that would be out of vocabulary in production stay so
+            params={"corpus_paths": [train_path], "output_path": vectors_path, **spec["vectors"]},
+            inputs=[train_path], outputs=[vectors_path]
+        ))
+        training_inputs.append(vectors_path)
+
+    model_path = os.path.join(experiment_path, "models", "model-best")
+    stages.append(Stage(
+        "train", train_model,
+        params={"dataset_path": dataset_path, "experiment_path": experiment_path, **spec.get("training", {})},
+        inputs=training_inputs, outputs=[model_path]
+    ))
+    stages.append(Stage(
+        "evaluate", evaluate,
+        params={"dataset_path": dataset_path, "experiment_path": experiment_path, **spec.get("evaluation", {})},
+        inputs=[model_path, test_path], outputs=[os.path.join(experiment_path, "results", "results.json")]
+    ))
+    return stages
+
+
+def run_experiment(spec_path: str, force: tuple = ()) -> dict:
+    """Runs the experiment described by a spec file without prompts, skipping the stages that are up to date
+
+    Stage state is kept in experiments/<name>/.stages; see `utilities.stage_graph.StageGraph`.
+    """
+    with open(spec_path) as spec_file:
+        spec = json.load(spec_file)
+    experiment_path = os.path.join("experiments", spec["experiment_name"])
+    for folder in ["models", "results"]:
+        os.makedirs(os.path.join(experiment_path, folder), exist_ok=True)
+    graph = StageGraph(
+        experiment_stages(spec), os.path.join(experiment_path, ".stages"), max_workers=spec.get("max_workers", 2)
+    )
+    report = graph.run(force=force)
+    with open(os.path.join(experiment_path, "results", "stages.json"), "w") as report_file:
+        json.dump(report, report_file, indent=4)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run an experiment from a spec file, skipping up to date stages")
+    parser.add_argument("spec_path", help="JSON experiment spec, see experiment_spec.json")
+    parser.add_argument("--force", nargs="*", default=[], help="stages to rerun even when up to date")
+    args = parser.parse_args()
+    run_experiment(args.spec_path, force=tuple(args.force))
@@ -0,0 +1,166 @@
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from run_experiment import experiment_stages
+from spacy_impl.evaluate import evaluate
+from spacy_impl.train import train_model
+from spacy_impl.vectors import ensure_package
+from utilities.stage_graph import StageGraph
+
+# grid keys that aren't config.cfg paths
+LABELS_KEY = "labels"
+
+
+def grid_points(grid: dict) -> list:
+    """Every combination of the grid's values, as {key: value} dicts in a stable order"""
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def available_memory_mb():
+    """MemAvailable from /proc/meminfo, None where it can't be read"""
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def sweep_concurrency(memory_per_run_mb: float, max_workers: int = None) -> int:
+    """Training runs that fit at once: one per CPU, as many as `memory_per_run_mb` fits in available memory"""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    memory = available_memory_mb()
+    limits = [cpus, max_workers or cpus, int(memory // memory_per_run_mb) if memory is not None else cpus]
+    return max(1, min(limits))
+
+
+def run_overrides(point: dict, training: dict) -> dict:
+    """The config.cfg overrides of a run: the base spec's "config_overrides" updated with the grid point's"""
+    overrides = dict(training.get("config_overrides") or {})
+    overrides.update({key: value for key, value in point.items() if key != LABELS_KEY})
+    labels = point.get(LABELS_KEY)
+    if labels is not None:
+        overrides.update({"corpora.train.labels": labels, "corpora.dev.labels": labels})
+    return overrides
+
+
+def train_and_evaluate(dataset_path: str, run_path: str, point: dict, training: dict, evaluation: dict) -> dict:
+    """One sweep run, in a worker process"""
+    labels = point.get(LABELS_KEY)
+    overrides = run_overrides(point, training)
+    training = {key: value for key, value in training.items() if key != "config_overrides"}
+    throughput = train_model(dataset_path, run_path, config_overrides=overrides, **training)
+    results = evaluate(dataset_path, run_path, labels=labels, **evaluation)
+    return {"throughput": throughput, "results": results}
+
+
+def comparison_row(name: str, point: dict, run_path: str) -> dict:
+    """A run's grid point, scores, per-label F1 and speed, read back from its results files"""
+    with open(os.path.join(run_path, "results", "results.json")) as results_file:
+        results = json.load(results_file)
+    row = {"run": name}
+    row.update({key: json.dumps(value) if isinstance(value, list) else value for key, value in point.items()})
+    row.update({"ents_p": results["ents_p"], "ents_r": results["ents_r"], "ents_f": results["ents_f"]})
+    row.update({f"f_{label}": scores["f"] for label, scores in (results["ents_per_type"] or {}).items()})
+    row["docs_per_second"] = results.get("speed", {}).get("docs_per_second")
+    throughput_path = os.path.join(run_path, "results", "training_throughput.json")
+    if os.path.exists(throughput_path):
+        with open(throughput_path) as throughput_file:
+            row["train_words_per_second"] = json.load(throughput_file)["words_per_second"]
+    return row
+
+
+def run_sweep(sweep_spec_path: str, force: bool = False) -> pd.DataFrame:
+    """Trains and evaluates one model per point of a grid of config.cfg overrides, sharing one prepared corpus
+
+    The sweep spec names a base experiment spec (see run_experiment.py), whose dataset, conversion and vectors
+    stages are run once through a `StageGraph` and skipped when up to date, and a "grid" of config.cfg override
+    values, applied over the base spec's own "config_overrides"; "labels" in the grid trains and scores on a subset
+    of the labels. Runs go to experiments/<sweep_name>/runs/run_NNN over a process pool sized by
+    `sweep_concurrency`, and runs that already have results for the same point are not repeated unless `force` is
+    set. The comparison table of every run is written to comparison.csv and returned.
+    """
+    with open(sweep_spec_path) as spec_file:
+        sweep_spec = json.load(spec_file)
+    with open(sweep_spec["experiment_spec"]) as spec_file:
+        spec = json.load(spec_file)
+    sweep_path = os.path.join("experiments", sweep_spec["sweep_name"])
+
+    # the corpus and vectors are prepared once for every run
+    preparation = [stage for stage in experiment_stages(spec) if stage.name not in ["train", "evaluate"]]
+    StageGraph(preparation, os.path.join(sweep_path, ".stages"), max_workers=spec.get("max_workers", 2)).run()
+    dataset_path = os.path.join("datasets", spec["dataset"]["dataset_name"]) if "dataset" in spec \
+        else spec["dataset_path"]
+    training = dict(spec.get("training", {}))
+    runs = {
+        f"run_{index:03d}": (point, os.path.join(sweep_path, "runs", f"run_{index:03d}"))
+        for index, point in enumerate(grid_points(sweep_spec["grid"]))
+    }
+
+    # vectors are resolved and installed once, here, unless every run sets (or disables) them through its overrides
+    if any("paths.vectors" not in run_overrides(point, training) for point, _ in runs.values()):
+        if training.get("vectors") is None:
+            pruned_vectors = os.path.join(dataset_path, "vectors")
+            training["vectors"] = pruned_vectors if os.path.isdir(pruned_vectors) else "en_core_web_lg"
+        ensure_package(training["vectors"])
+
+    pending = {}
+    for name, (point, run_path) in runs.items():
+        point_path = os.path.join(run_path, "point.json")
+        if not force and os.path.exists(os.path.join(run_path, "results", "results.json")) \
+                and os.path.exists(point_path):
+            with open(point_path) as point_file:
+                if json.load(point_file) == point:
+                    continue
+        for folder in ["models", "results"]:
+            os.makedirs(os.path.join(run_path, folder), exist_ok=True)
+        # results of a different point, or of a run that's about to be repeated, must not end up in the table
+        if os.path.exists(os.path.join(run_path, "results", "results.json")):
+            os.remove(os.path.join(run_path, "results", "results.json"))
+        with open(point_path, "w") as point_file:
+            json.dump(point, point_file, indent=4)
+        pending[name] = (point, run_path)
+
+    workers = sweep_concurrency(sweep_spec.get("memory_per_run_mb", 2000), sweep_spec.get("max_workers"))
+    print(f"sweep {sweep_spec['sweep_name']}: {len(pending)} of {len(runs)} runs to train, {workers} at a time")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                train_and_evaluate, dataset_path, run_path, point, training, spec.get("evaluation", {})
+            ): name
+            for name, (point, run_path) in pending.items()
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                future.result()
+                print(f"{name}: done")
+            except (Exception, SystemExit) as e:
+                # spaCy exits on config errors, which must not end the whole sweep
+                print(f"{name}: failed, {e!r}")
+
+    rows = [
+        comparison_row(name, point, run_path) for name, (point, run_path) in runs.items()
+        if os.path.exists(os.path.join(run_path, "results", "results.json"))
+    ]
+    comparison = pd.DataFrame(rows)
+    if not comparison.empty:
+        comparison = comparison.sort_values("ents_f", ascending=False)
+        print(comparison.to_string(index=False))
+    comparison.to_csv(os.path.join(sweep_path, "comparison.csv"), index=False)
+    return comparison
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train and compare one model per point of a grid of config overrides")
+    parser.add_argument("sweep_spec_path", help="JSON sweep spec, see sweep_spec.json")
+    parser.add_argument("--force", action="store_true", help="rerun points that already have results")
+    args = parser.parse_args()
+    run_sweep(args.sweep_spec_path, force=args.force)
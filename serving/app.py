@@ -0,0 +1,109 @@
+import argparse
+import contextlib
+import json
+
+import anyio
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+from algorithms.regex_analyzer import RegexAnalyzer
+from algorithms.spacy_analyzer import SpacyAnalyzer
+from serving.micro_batcher import MicroBatcher, Overloaded, RequestTooLarge
+from utilities.record_io import to_serializable
+
+
+def json_response(content, status_code: int = 200, headers: dict = None) -> Response:
+    # DaysRange values aren't handled by starlette's JSONResponse
+    return Response(
+        json.dumps(content, default=to_serializable), status_code=status_code, headers=headers,
+        media_type="application/json"
+    )
+
+
+def is_sentence_list(sentences) -> bool:
+    """Whether a request's `sentences` is a list of {"id", "text"} objects with string text"""
+    return isinstance(sentences, list) and all(
+        isinstance(sentence, dict) and "id" in sentence and isinstance(sentence.get("text"), str)
+        for sentence in sentences
+    )
+
+
+def create_app(model_path: str = None, max_batch_size: int = 256, max_wait_ms: float = 10,
+               max_pending: int = 10000) -> Starlette:
+    """Builds the scoring service
+
+    POST /analyze/regex and, when `model_path` points at a trained pipeline such as
+    `experiments/<name>/models/model-best`, POST /analyze/spacy take {"sentences": [{"id", "text"}, ...]} and return
+    {"responses": [...]} in `AnalysisResponse` format. GET /metrics reports queue depth and latency histograms.
+    """
+    batchers = {
+        "regex": MicroBatcher(RegexAnalyzer(), max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                              max_pending=max_pending)
+    }
+    if model_path is not None:
+        batchers["spacy"] = MicroBatcher(
+            SpacyAnalyzer(model_path=model_path, batch_size=max_batch_size), max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms, max_pending=max_pending
+        )
+
+    async def analyze(request: Request):
+        batcher = batchers.get(request.path_params["analyzer"])
+        if batcher is None:
+            return json_response({"error": f"unknown analyzer {request.path_params['analyzer']}"}, 404)
+        try:
+            sentences = (await request.json())["sentences"]
+        except (ValueError, KeyError, TypeError):
+            return json_response({"error": "expected a JSON body with a 'sentences' list"}, 400)
+        # checked here, a malformed request reaching the batcher would fail the batch it shares with others
+        if not is_sentence_list(sentences):
+            return json_response({"error": "'sentences' must be a list of objects with 'id' and 'text' keys"}, 400)
+        try:
+            responses = await batcher.submit(sentences)
+        except RequestTooLarge as e:
+            # retrying can't help, so no Retry-After
+            return json_response({"error": str(e)}, 413)
+        except Overloaded as e:
+            return json_response({"error": str(e)}, 503, headers={"Retry-After": "1"})
+        return json_response({"responses": responses})
+
+    async def metrics(request: Request):
+        return json_response({name: batcher.stats() for name, batcher in batchers.items()})
+
+    async def health(request: Request):
+        return json_response({"status": "ok", "analyzers": list(batchers)})
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        async with anyio.create_task_group() as task_group:
+            for batcher in batchers.values():
+                task_group.start_soon(batcher.run)
+            yield
+            task_group.cancel_scope.cancel()
+
+    return Starlette(
+        routes=[
+            Route("/analyze/{analyzer}", analyze, methods=["POST"]),
+            Route("/metrics", metrics),
+            Route("/health", health)
+        ],
+        lifespan=lifespan
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the sentencing analyzers over HTTP")
+    parser.add_argument("--model-path", default=None, help="e.g. experiments/<name>/models/model-best")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=256)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--max-pending", type=int, default=10000)
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(args.model_path, args.max_batch_size, args.max_wait_ms, args.max_pending),
+        host=args.host, port=args.port
+    )
@@ -0,0 +1,70 @@
+import argparse
+import http.client
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from utilities.sample_sentences import generate_sentences
+
+
+def run_client(url: str, sentences_per_request: int, duration_seconds: float, seed: int):
+    """Sends requests back to back on one connection, returns (latencies in ms, sentences sent, rejected requests)"""
+    parsed = urlparse(url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=60)
+    body = json.dumps({"sentences": generate_sentences(sentences_per_request, seed=seed)})
+    latencies = []
+    sentences_sent = 0
+    rejected = 0
+    deadline = time.perf_counter() + duration_seconds
+    while time.perf_counter() < deadline:
+        started_at = time.perf_counter()
+        connection.request("POST", parsed.path, body=body, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        response.read()
+        if response.status == 503:
+            rejected += 1
+            continue
+        if response.status != 200:
+            raise RuntimeError(f"{url} returned {response.status}")
+        latencies.append((time.perf_counter() - started_at) * 1000)
+        sentences_sent += sentences_per_request
+    connection.close()
+    return latencies, sentences_sent, rejected
+
+
+def percentile(sorted_values: list, quantile: float):
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(quantile * len(sorted_values)) - 1)]
+
+
+def load_test(url: str, concurrency: int, sentences_per_request: int, duration_seconds: float) -> dict:
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(
+            lambda seed: run_client(url, sentences_per_request, duration_seconds, seed), range(concurrency)
+        ))
+    elapsed = time.perf_counter() - started_at
+    latencies = sorted(latency for client_latencies, _, _ in results for latency in client_latencies)
+    return {
+        "requests": len(latencies),
+        "rejected_requests": sum(rejected for _, _, rejected in results),
+        "requests_per_sec": len(latencies) / elapsed,
+        "sentences_per_sec": sum(sent for _, sent, _ in results) / elapsed,
+        "p50_ms": percentile(latencies, 0.5),
+        "p99_ms": percentile(latencies, 0.99),
+        "max_ms": latencies[-1] if latencies else None
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test a running scoring service")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/analyze/regex")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--sentences-per-request", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    args = parser.parse_args()
+    for key, value in load_test(args.url, args.concurrency, args.sentences_per_request, args.duration).items():
+        print(f"{key}: {value}")
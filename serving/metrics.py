@@ -0,0 +1,49 @@
+import bisect
+import math
+
+DEFAULT_BUCKETS_MS = [0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram in milliseconds, cheap enough to update on every request
+
+    Percentiles are reported as the upper bound of the bucket they fall in.
+    """
+
+    def __init__(self, buckets_ms: list = None):
+        self.buckets_ms = buckets_ms if buckets_ms is not None else DEFAULT_BUCKETS_MS
+        self.counts = [0] * (len(self.buckets_ms) + 1)  # the last bucket catches everything above the largest bound
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, value_ms: float):
+        self.counts[bisect.bisect_left(self.buckets_ms, value_ms)] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def percentile(self, quantile: float):
+        if self.count == 0:
+            return None
+        rank = math.ceil(quantile * self.count)
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets_ms[index] if index < len(self.buckets_ms) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else None,
+            "max_ms": self.max_ms,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "buckets": {
+                **{f"le_{bound}": count for bound, count in zip(self.buckets_ms, self.counts)},
+                "inf": self.counts[-1]
+            }
+        }
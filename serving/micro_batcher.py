@@ -0,0 +1,125 @@
+import math
+import time
+
+import anyio
+
+from serving.metrics import LatencyHistogram
+
+
+class Overloaded(Exception):
+    """Raised when accepting a request would exceed the batcher's pending sentence limit"""
+
+
+class RequestTooLarge(Exception):
+    """Raised for a request with more sentences than the batcher would ever queue at once"""
+
+
+class PendingRequest:
+    __slots__ = ("sentences", "responses", "error", "done", "enqueued_at")
+
+    def __init__(self, sentences: list):
+        self.sentences = sentences
+        self.responses = None
+        self.error = None
+        self.done = anyio.Event()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """Collects concurrent requests into one `analyze_batch` call
+
+    A batch is closed once it holds `max_batch_size` sentences or `max_wait_ms` has passed since its first request
+    arrived, then runs on a worker thread while the next batch fills. Requests that would push the number of queued
+    sentences past `max_pending` are rejected with `Overloaded` instead of queueing without bound, and requests
+    larger than `max_pending` on their own, which could never be accepted, with `RequestTooLarge`. When a batch
+    fails, its requests are retried one at a time so an error only reaches the requests that cause it.
+    """
+
+    def __init__(self, analyzer, max_batch_size: int = 256, max_wait_ms: float = 10, max_pending: int = 10000):
+        self.analyzer = analyzer
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_pending = max_pending
+        self.pending_sentences = 0
+        self.rejected_requests = 0
+        self.request_latency = LatencyHistogram()
+        self.queue_latency = LatencyHistogram()
+        self.batch_latency = LatencyHistogram()
+        self.batches = 0
+        self.batched_sentences = 0
+        self._send, self._receive = anyio.create_memory_object_stream(math.inf)
+
+    async def submit(self, sentences: list) -> list:
+        if len(sentences) > self.max_pending:
+            self.rejected_requests += 1
+            raise RequestTooLarge(f"{len(sentences)} sentences, at most {self.max_pending} are accepted per request")
+        if self.pending_sentences + len(sentences) > self.max_pending:
+            self.rejected_requests += 1
+            raise Overloaded(f"{self.pending_sentences} sentences already queued")
+        self.pending_sentences += len(sentences)
+        request = PendingRequest(sentences)
+        await self._send.send(request)
+        await request.done.wait()
+        self.request_latency.observe((time.perf_counter() - request.enqueued_at) * 1000)
+        if request.error is not None:
+            raise request.error
+        return request.responses
+
+    async def _next_batch(self) -> list:
+        batch = [await self._receive.receive()]
+        batch_size = len(batch[0].sentences)
+        deadline = anyio.current_time() + self.max_wait_ms / 1000
+        while batch_size < self.max_batch_size:
+            with anyio.move_on_after(max(0.0, deadline - anyio.current_time())) as scope:
+                request = await self._receive.receive()
+            if scope.cancelled_caught:
+                break
+            batch.append(request)
+            batch_size += len(request.sentences)
+        return batch
+
+    async def run(self):
+        """Processes batches until cancelled, meant to be started in the app's task group"""
+        while True:
+            batch = await self._next_batch()
+            sentences = [sentence for request in batch for sentence in request.sentences]
+            started_at = time.perf_counter()
+            for request in batch:
+                self.queue_latency.observe((started_at - request.enqueued_at) * 1000)
+            try:
+                responses = await anyio.to_thread.run_sync(self.analyzer.analyze_batch, sentences)
+            except Exception as e:
+                responses = None
+                error = e
+            self.batch_latency.observe((time.perf_counter() - started_at) * 1000)
+            self.batches += 1
+            self.batched_sentences += len(sentences)
+
+            offset = 0
+            for request in batch:
+                if responses is not None:
+                    request.responses = responses[offset:offset + len(request.sentences)]
+                elif len(batch) == 1:
+                    request.error = error
+                else:
+                    # retry alone so that only the requests that fail by themselves get the error
+                    try:
+                        request.responses = await anyio.to_thread.run_sync(
+                            self.analyzer.analyze_batch, request.sentences
+                        )
+                    except Exception as e:
+                        request.error = e
+                offset += len(request.sentences)
+                self.pending_sentences -= len(request.sentences)
+                request.done.set()
+
+    def stats(self) -> dict:
+        return {
+            "pending_sentences": self.pending_sentences,
+            "rejected_requests": self.rejected_requests,
+            "request_latency": self.request_latency.to_dict(),
+            "queue_latency": self.queue_latency.to_dict(),
+            "batch_latency": self.batch_latency.to_dict(),
+            "batches": self.batches,
+            "mean_batch_size": self.batched_sentences / self.batches if self.batches else None
+        }
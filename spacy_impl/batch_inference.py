@@ -0,0 +1,68 @@
+import argparse
+import json
+import os
+import time
+
+from algorithms.spacy_analyzer import SpacyAnalyzer
+
+
+def batch_inference(model_path: str, input_path: str, output_path: str, checkpoint_path: str = None,
+                    checkpoint_interval: int = 10000, batch_size: int = 256, n_process: int = 1, exclude: tuple = (),
+                    stats_path: str = None, **reader_kwargs) -> dict:
+    """Runs a trained pipeline over a CSV or JSONL file of sentences and writes `AnalysisResponse` records as JSONL
+
+    Sentences are streamed through `nlp.pipe` with `n_process` processes, so memory stays bounded whatever the size of
+    the input. With `checkpoint_path` set, a rerun after a crash resumes from the last checkpoint (see
+    `BaseAnalyzer.analyze_file`), and only with the same model. Returns the per-stage throughput of this run, also
+    written to `stats_path`.
+    """
+    analyzer = SpacyAnalyzer(model_path=model_path, batch_size=batch_size, exclude=exclude, n_process=n_process)
+    start = time.perf_counter()
+    records = analyzer.analyze_file(
+        os.path.realpath(input_path), output_path, checkpoint_path=checkpoint_path,
+        checkpoint_interval=checkpoint_interval, checkpoint_fields={"model_path": os.path.realpath(model_path)},
+        **reader_kwargs
+    )
+    stats = {
+        "model_path": model_path,
+        "input_path": input_path,
+        "output_path": output_path,
+        "records": records,
+        "resumed_from": records - analyzer.sentences_analyzed,
+        "wall_seconds": time.perf_counter() - start,
+        "batch_size": batch_size,
+        "n_process": n_process,
+        **analyzer.throughput()
+    }
+    if stats_path is not None:
+        with open(stats_path, "w") as stats_file:
+            json.dump(stats, stats_file, indent=4)
+
+    print(f"{records} records in {output_path}, {analyzer.sentences_analyzed} analyzed this run "
+          f"in {stats['wall_seconds']:.1f}s")
+    for stage, stage_stats in stats["stages"].items():
+        print(f"  {stage:6}{stage_stats['seconds']:9.2f}s")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a trained spaCy model over a CSV or JSONL file of sentences")
+    parser.add_argument("model_path", help="e.g. experiments/<name>/models/model-best")
+    parser.add_argument("input_path", help="CSV with a header row or JSONL, with id and text fields")
+    parser.add_argument("output_path", help="JSONL file of analysis responses")
+    parser.add_argument("--checkpoint-path", default=None, help="defaults to <output_path>.checkpoint.json")
+    parser.add_argument("--checkpoint-interval", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--n-process", type=int, default=1)
+    parser.add_argument("--exclude", nargs="*", default=[], help="pipeline components to leave out")
+    parser.add_argument("--stats-path", default=None, help="defaults to <output_path>.stats.json")
+    parser.add_argument("--id-key", default="id")
+    parser.add_argument("--text-key", default="text")
+    args = parser.parse_args()
+    batch_inference(
+        args.model_path, args.input_path, args.output_path,
+        checkpoint_path=args.checkpoint_path or f"{args.output_path}.checkpoint.json",
+        checkpoint_interval=args.checkpoint_interval, batch_size=args.batch_size, n_process=args.n_process,
+        exclude=args.exclude, stats_path=args.stats_path or f"{args.output_path}.stats.json", id_key=args.id_key,
+        text_key=args.text_key
+    )
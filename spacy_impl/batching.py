@@ -0,0 +1,48 @@
+import itertools
+import random
+
+import spacy
+
+
+def length_bucketed_batches(seqs, size, tolerance: float = 0.2, discard_oversize: bool = False, get_length=len,
+                            buffer: int = 4096):
+    """Batches of sequences of similar length, sized by padded words
+
+    Reads `buffer` sequences at a time, sorts them by length and cuts batches whose padded size (longest sequence
+    times number of sequences) stays within `size` plus `tolerance`, then yields the batches of that buffer in random
+    order so lengths aren't seen in sequence. `size` is an int or a schedule giving the target for each batch.
+    """
+    sizes = itertools.repeat(size) if isinstance(size, int) else iter(size)
+    target = next(sizes)
+    seqs = iter(seqs)
+    while True:
+        window = sorted(itertools.islice(seqs, buffer), key=get_length)
+        if not window:
+            return
+        batches = []
+        batch = []
+        longest = 0
+        for seq in window:
+            length = get_length(seq)
+            if length > target * (1 + tolerance) and discard_oversize:
+                continue
+            if batch and max(longest, length) * (len(batch) + 1) > target * (1 + tolerance):
+                batches.append(batch)
+                batch = []
+                longest = 0
+                target = next(sizes)
+            batch.append(seq)
+            longest = max(longest, length)
+        if batch:
+            batches.append(batch)
+        random.shuffle(batches)
+        yield from batches
+
+
+@spacy.registry.batchers("sentencing.length_bucketed.v1")
+def configure_length_bucketed(size, tolerance: float = 0.2, discard_oversize: bool = False, get_length=None,
+                              buffer: int = 4096):
+    """Takes the same settings as spacy.batch_by_words.v1, so either can be selected by name alone"""
+    def batcher(seqs):
+        return length_bucketed_batches(seqs, size, tolerance, discard_oversize, get_length or len, buffer)
+    return batcher
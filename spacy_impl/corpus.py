@@ -0,0 +1,65 @@
+import random
+from typing import Callable, Iterator, List, Optional
+
+import spacy
+from spacy.tokens import DocBin
+from spacy.training import Example
+from spacy.training.corpus import walk_corpus
+
+
+class ShardedCorpus:
+    """Streams the Examples of a .spacy file or a directory of DocBin shards, one shard in memory at a time
+
+    Attributes
+    ----------
+    path : str
+        a .spacy file or a directory of them, e.g. written by `prepare_datasets.stream_to_shards`
+    shuffle : bool
+        shuffles the shard order and the docs within each shard, differently on every pass
+    seed : int
+        seeds the shuffling, pass `n` uses `seed + n`
+    max_length : int
+        skips docs of `max_length` tokens or more, 0 for no limit
+    limit : int
+        stops after this many examples, 0 for no limit
+    labels : list
+        keeps only the entities with these labels, None for all of them
+    """
+
+    def __init__(self, path: str, shuffle: bool = False, seed: int = 0, max_length: int = 0, limit: int = 0,
+                 labels: list = None):
+        self.path = path
+        self.shuffle = shuffle
+        self.seed = seed
+        self.max_length = max_length
+        self.limit = limit
+        self.labels = set(labels) if labels is not None else None
+        self.passes = 0
+
+    def __call__(self, nlp) -> Iterator[Example]:
+        rng = random.Random(self.seed + self.passes)
+        self.passes += 1
+        shards = walk_corpus(self.path, ".spacy")
+        if self.shuffle:
+            rng.shuffle(shards)
+        count = 0
+        for shard in shards:
+            docs = DocBin().from_disk(shard).get_docs(nlp.vocab)
+            if self.shuffle:
+                docs = list(docs)
+                rng.shuffle(docs)
+            for reference in docs:
+                if len(reference) == 0 or (self.max_length and len(reference) >= self.max_length):
+                    continue
+                if self.labels is not None:
+                    reference.ents = [ent for ent in reference.ents if ent.label_ in self.labels]
+                yield Example(nlp.make_doc(reference.text), reference)
+                count += 1
+                if self.limit and count >= self.limit:
+                    return
+
+
+@spacy.registry.readers("sentencing.ShardedCorpus.v1")
+def create_sharded_corpus(path: str, shuffle: bool = False, seed: int = 0, max_length: int = 0, limit: int = 0,
+                          labels: Optional[List[str]] = None) -> Callable[["spacy.Language"], Iterator[Example]]:
+    return ShardedCorpus(path, shuffle=shuffle, seed=seed, max_length=max_length, limit=limit, labels=labels)
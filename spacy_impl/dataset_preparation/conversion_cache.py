@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+from collections import Counter
+
+import pandas as pd
+import spacy
+from spacy.tokens import DocBin
+
+# bump whenever `labels_to_doc_bin` changes what it produces for the same row
+CONVERSION_VERSION = 1
+
+
+def conversion_version(nlp) -> str:
+    """Hash of everything besides the row itself that shapes a converted Doc"""
+    config = json.dumps(
+        [CONVERSION_VERSION, spacy.__version__, nlp.lang, nlp.config["nlp"]["tokenizer"]], sort_keys=True, default=str
+    )
+    return hashlib.sha256(config.encode()).hexdigest()
+
+
+def row_key(entities: list) -> str:
+    """Hash of a row's text and span annotations"""
+    spans = [
+        [None if pd.isna(ent["start"]) else int(ent["start"]), None if pd.isna(ent["end"]) else int(ent["end"]),
+         ent["labels"][0] if ent["labels"] else None]
+        for ent in entities
+    ]
+    text = entities[0]["text"] if entities else None
+    text = None if text is None or pd.isna(text) else text
+    return hashlib.sha256(json.dumps([text, spans]).encode()).hexdigest()
+
+
+def block_key(row_keys: list) -> str:
+    return hashlib.sha256("".join(row_keys).encode()).hexdigest()
+
+
+def content_defined_blocks(row_keys: list, average_size: int = 1000, max_size: int = 4000) -> list:
+    """Cuts rows into (start, end) blocks of about `average_size` rows, with boundaries chosen by row content
+
+    A block ends after every row whose key is 0 modulo `average_size`, so inserting or removing a row only changes
+    the block it falls in instead of shifting every boundary after it.
+    """
+    blocks = []
+    start = 0
+    for index, key in enumerate(row_keys):
+        if int(key[:8], 16) % average_size == 0 or index + 1 - start >= max_size:
+            blocks.append((start, index + 1))
+            start = index + 1
+    if start < len(row_keys):
+        blocks.append((start, len(row_keys)))
+    return blocks
+
+
+class ConversionCache:
+    """SQLite store of converted DocBins keyed by `block_key`, the hash of the `row_key` of every row in the block
+
+    Whole blocks are cached rather than single Docs because deserializing one Doc costs more than tokenizing a
+    sentence again, while a DocBin of a thousand docs loads in a few milliseconds. Blocks written under a different
+    `conversion_version` are deleted when the store is opened, so a spaCy upgrade or a tokenizer change reconverts
+    everything.
+
+    Attributes
+    ----------
+    db_path : str
+        path of the SQLite file
+    version : str
+        `conversion_version` of the pipeline the docs were made with
+    hits, misses : int
+        rows read from the cache and rows converted since the cache was opened
+    conversion_seconds, lookup_seconds : float
+        time spent converting the misses and reading the hits
+    seconds_saved : float
+        time the hits originally took to convert, stored with every block
+    """
+
+    def __init__(self, db_path: str, version: str):
+        self.db_path = db_path
+        self.version = version
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(db_path, timeout=60)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS conversions ("
+            "key TEXT PRIMARY KEY, version TEXT NOT NULL, doc_bin BLOB NOT NULL, dropped TEXT NOT NULL, "
+            "seconds REAL NOT NULL)"
+        )
+        self.connection.execute("DELETE FROM conversions WHERE version != ?", (version,))
+        self.connection.commit()
+        self.hits = 0
+        self.misses = 0
+        self.conversion_seconds = 0.0
+        self.lookup_seconds = 0.0
+        self.seconds_saved = 0.0
+
+    def get_many(self, keys: list, batch_size: int = 500) -> dict:
+        """Returns {key: (DocBin, dropped spans)} for the keys that are stored"""
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        for start in range(0, len(unique_keys), batch_size):
+            batch = unique_keys[start:start + batch_size]
+            rows = self.connection.execute(
+                f"SELECT key, doc_bin, dropped, seconds FROM conversions WHERE key IN ({','.join('?' * len(batch))})",
+                batch
+            )
+            for key, doc_bin, dropped, seconds in rows:
+                self.seconds_saved += seconds
+                found[key] = DocBin().from_bytes(doc_bin), Counter({
+                    (label, reason): count for label, reason, count in json.loads(dropped)
+                })
+        return found
+
+    def put(self, key: str, doc_bin: DocBin, dropped: Counter, seconds: float):
+        """Stores a converted block along with the `seconds` its conversion took"""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO conversions (key, version, doc_bin, dropped, seconds) VALUES (?, ?, ?, ?, ?)",
+            (key, self.version, doc_bin.to_bytes(),
+             json.dumps([[label, reason, count] for (label, reason), count in dropped.items()]), seconds)
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def report(self) -> dict:
+        rows = self.hits + self.misses
+        report = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / rows if rows else 0.0,
+            "conversion_seconds": self.conversion_seconds,
+            "lookup_seconds": self.lookup_seconds,
+            "seconds_saved": self.seconds_saved - self.lookup_seconds
+        }
+        print(
+            f"conversion cache: {self.hits}/{rows} rows reused ({report['hit_rate']:.1%}), "
+            f"{self.misses} converted in {self.conversion_seconds:.1f}s, "
+            f"{report['seconds_saved']:.1f}s saved"
+        )
+        return report
@@ -1,46 +1,259 @@
+import glob
 import spacy
 import os
+import time
 import pandas as pd
 import utilities.annotation_conversions as label_conversions
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from spacy.tokens import DocBin
 from tqdm import tqdm
 from spacy.util import filter_spans
 
+from spacy_impl.dataset_preparation.conversion_cache import (
+    ConversionCache, block_key, content_defined_blocks, conversion_version, row_key
+)
 
-def prepare_datasets_for_model(dataset_config: list, annotation_format: str):
+_worker_nlp = None
 
+
+def _init_worker(language: str):
+    global _worker_nlp
+    _worker_nlp = spacy.blank(language)
+
+
+def _convert_shard(label_lists: list):
+    return labels_to_doc_bin(_worker_nlp, label_lists)
+
+
+def label_list_to_doc(nlp, entities: list, dropped: Counter):
+    """Converts one document's label list into a Doc, None when there is nothing to convert
+
+    Spans that are dropped are counted per (label, reason) in `dropped`, either because `char_span` could not align
+    them to tokens ("char_span") or because `filter_spans` removed them as overlapping ("overlap").
+    """
+    if len(entities) == 0:
+        return None
+    text = entities[0]["text"]  # same for all entities
+    if (text is None) or (pd.isna(text)):
+        return None
+    doc = nlp.make_doc(text)
+    ents = []
+
+    for ent in entities:
+        start = ent["start"]
+        end = ent["end"]
+        if not pd.isna(start):
+            entity_label = ent["labels"][0]
+            span = doc.char_span(start, end, entity_label, alignment_mode="expand")
+            if span is not None:
+                ents.append(span)
+            else:
+                dropped[(entity_label, "char_span")] += 1
+    filtered_ents = filter_spans(ents)
+    if len(filtered_ents) < len(ents):
+        dropped.update((span.label_, "overlap") for span in set(ents) - set(filtered_ents))
+    doc.ents = filtered_ents
+    return doc
+
+
+def labels_to_doc_bin(nlp, label_lists):
+    """Converts per-document label lists into a DocBin, returned with the spans dropped per (label, reason)"""
+    dropped = Counter()
+    docs = (label_list_to_doc(nlp, entities, dropped) for entities in label_lists)
+    doc_bin = DocBin(docs=[doc for doc in docs if doc is not None])
+    return doc_bin, dropped
+
+
+def _convert_blocks(blocks: list, workers: int, language: str):
+    if workers == 1 or len(blocks) == 1:
+        nlp = spacy.blank(language)
+        yield from (labels_to_doc_bin(nlp, block) for block in blocks)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(language,)) as executor:
+        yield from executor.map(_convert_shard, blocks)
+
+
+def iter_doc_bins(label_lists: list, workers: int = 1, shard_size: int = 10000, language: str = "en",
+                  cache: ConversionCache = None):
+    """Yields (DocBin, dropped spans) for consecutive blocks of `label_lists`, in order
+
+    Without a `cache` the blocks are shards of `shard_size` documents, converted in `workers` processes when there
+    are more than one. With a `cache` they are `content_defined_blocks` of the row keys, and only the blocks that are
+    not in the cache yet are converted.
+    """
+    if cache is None:
+        shards = [label_lists[start:start + shard_size] for start in range(0, len(label_lists), shard_size)]
+        yield from tqdm(_convert_blocks(shards, workers, language), total=len(shards))
+        return
+
+    keys = [row_key(entities) for entities in label_lists]
+    blocks = content_defined_blocks(keys)
+    block_keys = [block_key(keys[start:end]) for start, end in blocks]
+    lookup_start = time.perf_counter()
+    converted = cache.get_many(block_keys)
+    cache.lookup_seconds += time.perf_counter() - lookup_start
+    missing = {key: label_lists[start:end] for key, (start, end) in zip(block_keys, blocks) if key not in converted}
+
+    block_start = time.perf_counter()
+    for key, (doc_bin, dropped) in zip(missing, _convert_blocks(list(missing.values()), workers, language)):
+        # with several workers this is the time between blocks arriving, i.e. the wall time each one cost
+        seconds = time.perf_counter() - block_start
+        cache.put(key, doc_bin, dropped, seconds)
+        cache.conversion_seconds += seconds
+        converted[key] = doc_bin, dropped
+        block_start = time.perf_counter()
+    missing_rows = sum(len(block) for block in missing.values())
+    cache.misses += missing_rows
+    cache.hits += len(label_lists) - missing_rows
+    for key in block_keys:
+        yield converted[key]
+
+
+def convert_labels(labels: list, workers: int = 1, shard_size: int = 10000, language: str = "en",
+                   cache: ConversionCache = None):
+    """Merges the blocks of `iter_doc_bins` into one DocBin
+
+    Blocks are merged back in their original order, so the result is the same for any number of workers and whether
+    or not blocks came from the cache. Returns the DocBin and the spans dropped per (label, reason).
+    """
+    doc_bin = DocBin()
+    dropped = Counter()
+    for block_doc_bin, block_dropped in iter_doc_bins(labels, workers, shard_size, language, cache):
+        doc_bin.merge(block_doc_bin)
+        dropped.update(block_dropped)
+    return doc_bin, dropped
+
+
+def stream_to_shards(conversion_format, dataset_path: str, output_directory: str, chunk_size: int = 10000,
+                     shard_size: int = 50000, language: str = "en", cache: ConversionCache = None):
+    """Converts the dataset `chunk_size` rows at a time into DocBin shards of about `shard_size` docs
+
+    Shards are written to `output_directory` as shard_00000.spacy, shard_00001.spacy, ... so peak memory is bounded
+    by one chunk and one shard whatever the size of the dataset. A shard is closed once it holds `shard_size` docs,
+    so it can exceed that by at most one conversion block. Returns the spans dropped per (label, reason).
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    for stale_shard in glob.glob(os.path.join(output_directory, "shard_*.spacy")):
+        os.remove(stale_shard)
+    dropped = Counter()
+    doc_bin = DocBin()
+    shard_index = 0
+    for chunk in conversion_format.load_chunks(dataset_path, chunk_size):
+        for block_doc_bin, block_dropped in iter_doc_bins(
+                chunk.get_labels().tolist(), shard_size=chunk_size, language=language, cache=cache
+        ):
+            doc_bin.merge(block_doc_bin)
+            dropped.update(block_dropped)
+            if len(doc_bin) >= shard_size:
+                doc_bin.to_disk(os.path.join(output_directory, f"shard_{shard_index:05d}.spacy"))
+                doc_bin = DocBin()
+                shard_index += 1
+    if len(doc_bin) or shard_index == 0:
+        doc_bin.to_disk(os.path.join(output_directory, f"shard_{shard_index:05d}.spacy"))
+    return dropped
+
+
+def report_dropped_spans(dataset_path: str, dropped: Counter) -> dict:
+    report = {}
+    for (label, reason), count in sorted(dropped.items()):
+        report.setdefault(label, {})[reason] = count
+    if report:
+        print(f"spans dropped converting {dataset_path}:")
+        for label, reasons in report.items():
+            print(f"  {label}: " + ", ".join(f"{count} ({reason})" for reason, count in reasons.items()))
+    return report
+
+
+CONVERSION_CACHE_DIR = "datasets/.conversion_cache"
+
+
+def spacy_dataset_config(dataset_path: str, split: str = None) -> list:
+    """`prepare_datasets_for_model` entries converting the dataset's training and test sets
+
+    The sets are the parts of `split` (the first one by default) of the dataset's splits.json manifest, read from
+    its full span table. Datasets created before the manifest existed are converted from train_df.csv/test_df.csv.
+    """
+    if os.path.exists(os.path.join(dataset_path, "splits.json")) \
+            or not os.path.exists(os.path.join(dataset_path, "train_df.csv")):
+        return [
+            {
+                "dataset_path": dataset_path, "split": split, "part": part,
+                "output_path": os.path.join(dataset_path, "spacy", f"{part}.spacy")
+            }
+            for part in ["train", "test"]
+        ]
+    return [
+        {
+            "dataset_path": os.path.join(dataset_path, "train_df.csv"),
+            "output_path": os.path.join(dataset_path, "spacy", "train.spacy")
+        },
+        {
+            "dataset_path": os.path.join(dataset_path, "test_df.csv"),
+            "output_path": os.path.join(dataset_path, "spacy", "test.spacy")
+        }
+    ]
+
+
+def prepare_datasets_for_model(dataset_config: list, annotation_format: str, workers: int = 1,
+                               shard_size: int = 10000, cache_dir: str = None):
+    """Writes one .spacy file per entry of `dataset_config`
+
+    With `workers` > 1 (None for one per CPU) documents are converted in shards of `shard_size` over a process pool.
+    Entries with "streaming": true are instead read in chunks and written as a directory of DocBin shards at
+    `output_path` (see `stream_to_shards`), which `spacy_impl.corpus` reads back lazily during training.
+    With a `cache_dir`, converted docs are cached there by row content, so rerunning on a dataset where only some
+    rows changed only converts the blocks holding those rows; the blocks are then content-defined rather than
+    shards of `shard_size` (see `iter_doc_bins`).
+
+    Returns the spans dropped per label for each output and the conversion cache report.
+    """
+    workers = workers or os.cpu_count()
+    cache = None
+    if cache_dir is not None:
+        cache = ConversionCache(os.path.join(cache_dir, "conversions.sqlite"), conversion_version(spacy.blank("en")))
+    dropped_spans = {}
     for dataset_to_convert in dataset_config:
         dataset_path = dataset_to_convert["dataset_path"]
-        nlp = spacy.blank("en")
-        doc_bin = DocBin()
-
-        dataset = pd.read_csv(dataset_path)
-
-        conversion_pipeline = getattr(label_conversions, annotation_format)(dataset)
-        labels = conversion_pipeline.get_labels()
-
-        for entities in tqdm(labels):
-            if len(entities) > 0:
-                text = entities[0]["text"]  # same for all entities
-                if (text is None) or (pd.isna(text)):
-                    continue
-                doc = nlp.make_doc(text)
-                ents = []
-
-                for ent in entities:
-                    start = ent["start"]
-                    end = ent["end"]
-                    if not pd.isna(start):
-                        entity_label = ent["labels"][0]
-                        span = doc.char_span(start, end, entity_label, alignment_mode="expand")
-                        if span is not None:
-                            ents.append(span)
-                filtered_ents = filter_spans(ents)
-                doc.ents = filtered_ents
-                doc_bin.add(doc)
+        output_file = dataset_to_convert["output_path"]
+
+        if dataset_to_convert.get("streaming"):
+            dropped = stream_to_shards(
+                getattr(label_conversions, annotation_format), dataset_path, output_file,
+                chunk_size=dataset_to_convert.get("chunk_size", 10000),
+                shard_size=dataset_to_convert.get("shard_size", 50000), cache=cache
+            )
+            dropped_spans[output_file] = report_dropped_spans(dataset_path, dropped)
+            continue
+
+        if "split" in dataset_to_convert:
+            # a split from the dataset's splits.json manifest, `dataset_path` is then the dataset directory
+            conversion_pipeline = label_conversions.SpanTable.load_split(
+                dataset_path, dataset_to_convert["split"], dataset_to_convert.get("part", "train")
+            )
+        else:
+            conversion_pipeline = getattr(label_conversions, annotation_format).load(dataset_path)
+        labels = conversion_pipeline.get_labels().tolist()
+
+        doc_bin, dropped = convert_labels(labels, workers=workers, shard_size=shard_size, cache=cache)
 
         # TODO: make directory for spaCy dataset
-        output_file = dataset_to_convert["output_path"]
         spacy_dir = os.path.dirname(output_file)
         os.makedirs(spacy_dir, exist_ok=True)
         doc_bin.to_disk(output_file)
+        dropped_spans[output_file] = report_dropped_spans(dataset_path, dropped)
+
+    cache_report = None
+    if cache is not None:
+        cache_report = cache.report()
+        cache.close()
+    return {"dropped_spans": dropped_spans, "conversion_cache": cache_report}
+
+
+def convert_dataset(dataset_path: str, output_path: str, annotation_format: str, workers: int = None,
+                    cache_dir: str = None, **entry):
+    """Converts one `spacy_dataset_config` entry, `entry` being its other keys, e.g. the split and part"""
+    return prepare_datasets_for_model(
+        [{"dataset_path": dataset_path, "output_path": output_path, **entry}], annotation_format, workers=workers,
+        cache_dir=cache_dir
+    )
@@ -0,0 +1,156 @@
+import argparse
+import glob
+import itertools
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import spacy
+from spacy.scorer import Scorer
+from spacy.tokens import DocBin
+from spacy.training.example import Example
+
+from spacy_impl.evaluate import predict
+from spacy_impl.model_registry import load_model, resident_memory_mb
+from spacy_impl.train import train_model
+from utilities.record_io import read_records
+
+# the student is config.cfg with a narrower and shallower tok2vec, smaller hash tables and no static vectors
+STUDENT_OVERRIDES = {
+    "components.tok2vec.model.encode.width": 96,
+    "components.tok2vec.model.encode.depth": 4,
+    "components.tok2vec.model.embed.rows": [2000, 500, 1000, 1000],
+    "components.tok2vec.model.embed.include_static_vectors": False,
+    "paths.vectors": None
+}
+
+
+def teacher_label(teacher_path: str, pool_path: str, output_directory: str, limit: int = None,
+                  batch_size: int = 256, n_process: int = 1, shard_size: int = 50000, **reader_kwargs) -> int:
+    """Runs the teacher over an unlabeled CSV or JSONL sentence pool and writes its entities as DocBin shards
+
+    Shards are named like those of `stream_to_shards`, so the directory can be used as a training corpus directly.
+    Only tokens and entities are stored. Returns the number of docs written.
+    """
+    nlp = load_model(teacher_path)
+    os.makedirs(output_directory, exist_ok=True)
+    for stale_shard in glob.glob(os.path.join(output_directory, "shard_*.spacy")):
+        os.remove(stale_shard)
+    texts = (record["text"] for record in itertools.islice(read_records(pool_path, **reader_kwargs), limit)
+             if record["text"])
+    docs = nlp.pipe(texts, batch_size=batch_size, n_process=n_process)
+    written = 0
+    shard_index = 0
+    while shard := list(itertools.islice(docs, shard_size)):
+        doc_bin = DocBin(attrs=["ORTH", "SPACY", "ENT_IOB", "ENT_TYPE", "ENT_KB_ID"], docs=shard)
+        doc_bin.to_disk(os.path.join(output_directory, f"shard_{shard_index:05d}.spacy"))
+        written += len(shard)
+        shard_index += 1
+    print(f"teacher labeled {written} sentences from {pool_path}")
+    return written
+
+
+def measure_pipeline(model_path: str, test_path: str, batch_size: int = 256) -> dict:
+    """Throughput, RSS growth and NER scores of a pipeline on the test set, run in a fresh process"""
+    baseline = resident_memory_mb()
+    nlp = spacy.load(model_path)
+    test_docs = list(DocBin().from_disk(test_path).get_docs(nlp.vocab))
+    predicted_docs, seconds = predict(nlp, test_docs, batch_size=batch_size)
+    scores = Scorer(nlp).score(
+        [Example(predicted=predicted, reference=doc) for predicted, doc in zip(predicted_docs, test_docs)]
+    )
+    return {
+        "docs_per_second": len(test_docs) / seconds if seconds else None,
+        "words_per_second": sum(len(doc) for doc in test_docs) / seconds if seconds else None,
+        "rss_mb": resident_memory_mb() - baseline if baseline is not None else None,
+        "model_mb": sum(
+            os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(model_path) for name in names
+        ) / 2 ** 20,
+        "ents_p": scores["ents_p"],
+        "ents_r": scores["ents_r"],
+        "ents_f": scores["ents_f"],
+        "ents_per_type": scores["ents_per_type"] or {}
+    }
+
+
+def in_fresh_process(function, *args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(function, *args).result()
+
+
+def distill(dataset_path: str, experiment_path: str, pool_path: str, limit: int = None, student_overrides: dict = None,
+            profile: str = "default", max_steps: int = None, n_process: int = 1, **reader_kwargs) -> dict:
+    """Trains a smaller student on sentences from `pool_path` labeled by the experiment's model-best
+
+    The student is trained with `train_model` under experiments/<name>/distilled/, with `STUDENT_OVERRIDES` and then
+    `student_overrides` applied to config.cfg, and the dataset's gold training corpus as dev set. Teacher and
+    student are then measured on the test set in separate processes; the comparison is written to
+    results/distillation_report.json and returned.
+    """
+    teacher_path = os.path.join(experiment_path, "models", "model-best")
+    student_experiment_path = os.path.join(experiment_path, "distilled")
+    for folder in ["models", "results", "teacher_labeled"]:
+        os.makedirs(os.path.join(student_experiment_path, folder), exist_ok=True)
+
+    labeled_path = os.path.join(student_experiment_path, "teacher_labeled")
+    pool_size = teacher_label(teacher_path, pool_path, labeled_path, limit=limit, n_process=n_process, **reader_kwargs)
+    overrides = {**STUDENT_OVERRIDES, **(student_overrides or {})}
+    train_model(dataset_path, student_experiment_path, profile=profile, max_steps=max_steps, train_path=labeled_path,
+                config_overrides=overrides)
+
+    test_path = os.path.join(dataset_path, "spacy", "test.spacy")
+    teacher = in_fresh_process(measure_pipeline, teacher_path, test_path)
+    student = in_fresh_process(
+        measure_pipeline, os.path.join(student_experiment_path, "models", "model-best"), test_path
+    )
+    labels = sorted(set(teacher["ents_per_type"]) | set(student["ents_per_type"]))
+    report = {
+        "pool_path": pool_path,
+        "pool_size": pool_size,
+        "student_overrides": overrides,
+        "teacher": teacher,
+        "student": student,
+        "speedup": student["docs_per_second"] / teacher["docs_per_second"] if teacher["docs_per_second"] else None,
+        "rss_ratio": student["rss_mb"] / teacher["rss_mb"] if teacher["rss_mb"] and student["rss_mb"] else None,
+        "ents_f_delta": student["ents_f"] - teacher["ents_f"],
+        "f_delta_per_type": {
+            label: student["ents_per_type"].get(label, {"f": 0.0})["f"]
+            - teacher["ents_per_type"].get(label, {"f": 0.0})["f"]
+            for label in labels
+        }
+    }
+    with open(os.path.join(experiment_path, "results", "distillation_report.json"), "w") as report_file:
+        json.dump(report, report_file, indent=4)
+
+    print(f"{'':9}{'docs/s':>9}{'RSS MiB':>9}{'model MiB':>11}{'ents_f':>8}")
+    for name, scores in [("teacher", teacher), ("student", student)]:
+        rss_mb = scores["rss_mb"] if scores["rss_mb"] is not None else float("nan")
+        print(f"{name:9}{scores['docs_per_second']:9.0f}{rss_mb:9.0f}{scores['model_mb']:11.1f}{scores['ents_f']:8.3f}")
+    for label in labels:
+        print(f"  {label}: F1 {report['f_delta_per_type'][label]:+.3f}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distill an experiment's model-best into a smaller student")
+    parser.add_argument("dataset_path", help="e.g. datasets/<name>, with spacy/train.spacy and spacy/test.spacy")
+    parser.add_argument("experiment_path", help="e.g. experiments/<name>, with models/model-best")
+    parser.add_argument("pool_path", help="CSV or JSONL of unlabeled sentences")
+    parser.add_argument("--limit", type=int, default=None, help="use at most this many pool sentences")
+    parser.add_argument("--id-key", default="id")
+    parser.add_argument("--text-key", default="text")
+    parser.add_argument("--width", type=int, default=STUDENT_OVERRIDES["components.tok2vec.model.encode.width"])
+    parser.add_argument("--depth", type=int, default=STUDENT_OVERRIDES["components.tok2vec.model.encode.depth"])
+    parser.add_argument("--profile", default="default")
+    parser.add_argument("--max-steps", type=int, default=None)
+    parser.add_argument("--n-process", type=int, default=1)
+    args = parser.parse_args()
+    distill(
+        args.dataset_path, args.experiment_path, args.pool_path, limit=args.limit,
+        student_overrides={
+            "components.tok2vec.model.encode.width": args.width, "components.tok2vec.model.encode.depth": args.depth
+        },
+        profile=args.profile, max_steps=args.max_steps, n_process=args.n_process, id_key=args.id_key,
+        text_key=args.text_key
+    )
@@ -1,20 +1,119 @@
-import spacy
 import os
 import json
-from spacy.tokens import DocBin
+import time
+import numpy as np
+from spacy.scorer import Scorer, get_ner_prf
+from spacy.tokens import Doc, DocBin
 from spacy.training.example import Example
 
+from algorithms.regex_analyzer import has_sentencing_cue
+from spacy_impl.model_registry import load_model
 
-def evaluate(dataset_path: str, experiment_path: str):
+
+def unannotated_copy(nlp, doc: Doc) -> Doc:
+    """The reference doc's tokens without any annotation, so the pipeline neither re-tokenizes nor sees gold entities"""
+    return Doc(nlp.vocab, words=[token.text for token in doc], spaces=[bool(token.whitespace_) for token in doc])
+
+
+def predict(nlp, reference_docs: list, batch_size: int = 256, n_process: int = 1):
+    """Runs the pipeline over unannotated copies of `reference_docs`, returns the predictions and the seconds taken"""
+    start = time.perf_counter()
+    predicted_docs = list(nlp.pipe(
+        (unannotated_copy(nlp, doc) for doc in reference_docs), batch_size=batch_size, n_process=n_process
+    ))
+    return predicted_docs, time.perf_counter() - start
+
+
+def latency_percentiles(nlp, reference_docs: list, sample_size: int = 500) -> dict:
+    """Single-doc latency over the first `sample_size` docs, one call per doc as a request would make it"""
+    latencies_ms = []
+    for doc in reference_docs[:sample_size]:
+        copy = unannotated_copy(nlp, doc)
+        start = time.perf_counter()
+        nlp(copy)
+        latencies_ms.append((time.perf_counter() - start) * 1000)
+    if not latencies_ms:
+        return {}
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99]).tolist()
+    return {"docs": len(latencies_ms), "p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+
+
+def evaluate(dataset_path: str, experiment_path: str, batch_size: int = 256, n_process: int = 1,
+             latency_sample: int = 500, labels: list = None):
+    """Scores model-best on the test set and writes accuracy, per-label scores and speed to results/results.json
+
+    Predictions come from `nlp.pipe` with `batch_size` and `n_process`, on the test docs' own tokenization. Speed
+    has the batched throughput and the percentiles of single-doc latency over `latency_sample` docs. With `labels`,
+    only gold entities with those labels are scored, for models trained on a subset of the labels.
+    """
     model_path = os.path.join(experiment_path, "models", "model-best")
-    nlp = spacy.load(model_path)
+    nlp = load_model(model_path)
     test_dataset_path = os.path.join(dataset_path, "spacy", "test.spacy")
     doc_bin = DocBin().from_disk(test_dataset_path)
     test_docs = list(doc_bin.get_docs(nlp.vocab))
+    if labels is not None:
+        for doc in test_docs:
+            doc.ents = [ent for ent in doc.ents if ent.label_ in labels]
 
-    examples = [Example(predicted=nlp(doc.text), reference=doc) for doc in test_docs]
+    predicted_docs, seconds = predict(nlp, test_docs, batch_size=batch_size, n_process=n_process)
+    examples = [Example(predicted=predicted, reference=doc) for predicted, doc in zip(predicted_docs, test_docs)]
 
-    results = nlp.evaluate(examples)
+    # scores the predictions as they are, `nlp.evaluate` would run the pipeline over them a second time
+    results = Scorer(nlp).score(examples)
+    results["speed"] = {
+        "batch_size": batch_size,
+        "n_process": n_process,
+        "docs_per_second": len(test_docs) / seconds if seconds else None,
+        "words_per_second": sum(len(doc) for doc in test_docs) / seconds if seconds else None,
+        "latency": latency_percentiles(nlp, test_docs, latency_sample)
+    }
     results_file = os.path.join(experiment_path, "results", "results.json")
     with open(results_file, "w") as outfile:
         json.dump(results, outfile, indent=4)
+    return results
+
+
+def evaluate_cascade(dataset_path: str, experiment_path: str):
+    """Measures how often the regex gate of `CascadeAnalyzer` skips the model and the NER recall that costs"""
+    model_path = os.path.join(experiment_path, "models", "model-best")
+    nlp = load_model(model_path)
+    test_dataset_path = os.path.join(dataset_path, "spacy", "test.spacy")
+    doc_bin = DocBin().from_disk(test_dataset_path)
+    test_docs = list(doc_bin.get_docs(nlp.vocab))
+
+    predicted_docs, _ = predict(nlp, test_docs)
+    skipped = [not has_sentencing_cue(doc.text) for doc in test_docs]
+    full_examples = [Example(predicted=predicted, reference=doc) for predicted, doc in zip(predicted_docs, test_docs)]
+    # a skipped sentence never reaches the model, so it ends up with no entities at all
+    cascade_examples = [
+        Example(predicted=nlp.make_doc(doc.text) if skip else predicted, reference=doc)
+        for predicted, doc, skip in zip(predicted_docs, test_docs, skipped)
+    ]
+    full_scores = get_ner_prf(full_examples)
+    cascade_scores = get_ner_prf(cascade_examples)
+
+    skipped_entities = {}
+    for doc, skip in zip(test_docs, skipped):
+        if skip:
+            for ent in doc.ents:
+                skipped_entities[ent.label_] = skipped_entities.get(ent.label_, 0) + 1
+
+    results = {
+        "docs": len(test_docs),
+        "skipped_docs": sum(skipped),
+        "skip_rate": sum(skipped) / len(test_docs) if test_docs else 0.0,
+        "gold_entities_in_skipped_docs": skipped_entities,
+        "full": full_scores,
+        "cascade": cascade_scores,
+        # get_ner_prf scores None when there are neither gold nor predicted entities, so there is no recall to lose
+        "recall_lost": full_scores["ents_r"] - cascade_scores["ents_r"]
+        if full_scores["ents_r"] is not None and cascade_scores["ents_r"] is not None else None,
+        "recall_lost_per_type": {
+            label: scores["r"] - (cascade_scores["ents_per_type"] or {}).get(label, {"r": 0.0})["r"]
+            for label, scores in (full_scores["ents_per_type"] or {}).items()
+        }
+    }
+    results_file = os.path.join(experiment_path, "results", "cascade_results.json")
+    with open(results_file, "w") as outfile:
+        json.dump(results, outfile, indent=4)
+    return results
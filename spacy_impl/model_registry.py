@@ -0,0 +1,134 @@
+import gc
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import spacy
+
+
+def directory_size_mb(path: str) -> float:
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names
+    ) / 2 ** 20
+
+
+def resident_memory_mb():
+    """Current RSS of this process, None where /proc isn't available"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return None
+
+
+class ModelRegistry:
+    """Keeps loaded spaCy pipelines in memory so each is loaded once per process
+
+    Pipelines are keyed by path and by the components excluded or disabled, and evicted least recently used first
+    once there are more than `max_models` or their estimated size exceeds `memory_budget_mb`. A pipeline's size is
+    the RSS growth while loading it, or its size on disk where RSS can't be read.
+
+    Workers of a `worker_pool` are forked and share the loaded weights copy-on-write instead of loading their own.
+
+    Attributes
+    ----------
+    max_models : int
+        maximum number of pipelines kept loaded
+    memory_budget_mb : float
+        maximum estimated memory of the loaded pipelines, None for no limit
+    loads : list
+        one {"model_path", "cold", "seconds"} record per `get`, cold being True when the pipeline was loaded
+    """
+
+    def __init__(self, max_models: int = 4, memory_budget_mb: float = None):
+        self.max_models = max_models
+        self.memory_budget_mb = memory_budget_mb
+        self.loads = []
+        self._models = OrderedDict()
+
+    def get(self, model_path: str, exclude: tuple = (), disable: tuple = ()):
+        """The pipeline at `model_path`, loaded with `spacy.load(model_path, exclude=..., disable=...)` on first use"""
+        key = (os.path.realpath(model_path), tuple(sorted(exclude)), tuple(sorted(disable)))
+        start = time.perf_counter()
+        if key in self._models:
+            self._models.move_to_end(key)
+            nlp = self._models[key]["nlp"]
+            self.loads.append({"model_path": model_path, "cold": False, "seconds": time.perf_counter() - start})
+            return nlp
+
+        rss_before = resident_memory_mb()
+        nlp = spacy.load(model_path, exclude=list(exclude), disable=list(disable))
+        rss_after = resident_memory_mb()
+        size_mb = rss_after - rss_before if rss_before is not None else directory_size_mb(model_path)
+        self._models[key] = {"nlp": nlp, "size_mb": max(size_mb, 0.0)}
+        self.loads.append({"model_path": model_path, "cold": True, "seconds": time.perf_counter() - start})
+        self._evict()
+        return nlp
+
+    def _evict(self):
+        # the pipeline just loaded is the most recent one and always stays
+        while len(self._models) > 1 and (
+                len(self._models) > self.max_models
+                or (self.memory_budget_mb is not None and self.memory_mb > self.memory_budget_mb)
+        ):
+            self._models.popitem(last=False)
+        gc.collect()
+
+    @property
+    def memory_mb(self) -> float:
+        return sum(entry["size_mb"] for entry in self._models.values())
+
+    def clear(self):
+        self._models.clear()
+        gc.collect()
+
+    def worker_pool(self, max_workers: int, initializer=None, initargs: tuple = ()) -> ProcessPoolExecutor:
+        """A process pool whose workers are forked with the collector frozen, where fork is available
+
+        Every object alive at the fork is frozen for it, so the workers' garbage collector never writes to the pages
+        holding loaded pipelines and copies them. The pool's workers are all forked here, by a first no-op task, and
+        the collector is unfrozen again right after; an application that froze objects itself is left as it was.
+        Where fork isn't available the pool uses the platform default and each worker loads its own pipelines.
+        """
+        if "fork" not in multiprocessing.get_all_start_methods():
+            return ProcessPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs)
+        executor = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context("fork"), initializer=initializer,
+            initargs=initargs
+        )
+        frozen_by_caller = gc.get_freeze_count() > 0
+        if not frozen_by_caller:
+            gc.collect()
+            gc.freeze()
+        try:
+            # with fork, the first task starts every worker of the pool at once
+            executor.submit(int).result()
+        finally:
+            if not frozen_by_caller:
+                gc.unfreeze()
+        return executor
+
+    def report(self) -> dict:
+        """Mean cold and warm `get` times, and what is currently loaded"""
+        cold = [load["seconds"] for load in self.loads if load["cold"]]
+        warm = [load["seconds"] for load in self.loads if not load["cold"]]
+        return {
+            "cold_loads": len(cold),
+            "cold_mean_seconds": sum(cold) / len(cold) if cold else None,
+            "warm_loads": len(warm),
+            "warm_mean_seconds": sum(warm) / len(warm) if warm else None,
+            "loaded": [
+                {"model_path": path, "size_mb": entry["size_mb"]} for (path, _, _), entry in self._models.items()
+            ],
+            "memory_mb": self.memory_mb
+        }
+
+
+# the registry shared by everything in this process
+MODEL_REGISTRY = ModelRegistry()
+
+
+def load_model(model_path: str, exclude: tuple = (), disable: tuple = ()):
+    return MODEL_REGISTRY.get(model_path, exclude=exclude, disable=disable)
@@ -1,7 +1,14 @@
+import json
+import shutil
 import spacy
 import os
 from spacy.cli.train import train
 
+import spacy_impl.batching  # noqa: F401, registers the batchers used by training profiles
+import spacy_impl.corpus  # noqa: F401, registers the corpus readers used by config.cfg
+from spacy_impl.training_profiles import TrainingBudgetExhausted, load_profile, profile_overrides
+from spacy_impl.vectors import ensure_package
+
 
 def generate_config():
     spacy.cli.init_config(  # Path to save the configuration file
@@ -11,22 +18,89 @@ def generate_config():
     ).to_disk("spacy/training_config/config.cfg")
 
 
-def train_model(dataset_path: str, experiment_path: str, write_config: bool = False):
+def train_model(dataset_path: str, experiment_path: str, write_config: bool = False, vectors: str = None,
+                profile: str = "default", batcher: str = None, batch_size: dict = None, max_steps: int = None,
+                max_seconds: float = None, eval_frequency: int = None, train_path: str = None,
+                config_overrides: dict = None):
+    """Trains the NER pipeline on the dataset's spacy/ corpus
+
+    `vectors` defaults to the dataset's pruned vectors (see `spacy_impl.vectors`) when they have been built, so
+    training runs offline, and to the full en_core_web_lg package otherwise.
+
+    Batching and budgets come from a `profile` in training_config/training_profiles.json; `batcher`,
+    `batch_size` ({"start", "stop", "compound"} of the batch size schedule), `max_steps`, `max_seconds` and
+    `eval_frequency` override it. Words/sec and the resolved profile are written to results/training_throughput.json.
+
+    `train_path` replaces the dataset's own training corpus, e.g. with teacher-labeled docs (see `spacy_impl.distill`),
+    which stays the dev corpus. `config_overrides` are applied to config.cfg last; when they set "paths.vectors",
+    `vectors` is ignored.
+
+    When training stops before its first evaluation, model-last is copied to model-best with a warning, so the
+    evaluation that follows still finds a model.
+    """
     if write_config:
         generate_config()
 
-    spacy.cli.download("en_core_web_lg")
+    config_overrides = config_overrides or {}
+    if "paths.vectors" not in config_overrides:
+        if vectors is None:
+            pruned_vectors = os.path.join(dataset_path, "vectors")
+            vectors = pruned_vectors if os.path.isdir(pruned_vectors) else "en_core_web_lg"
+        ensure_package(vectors)
     model_store_directory = os.path.join(experiment_path, "models")
     train_dataset_path = os.path.join(dataset_path, "spacy", "train.spacy")
+    overrides = {}
+    if os.path.isdir(os.path.join(dataset_path, "spacy", "train")):
+        train_dataset_path = os.path.join(dataset_path, "spacy", "train")
+    dev_dataset_path = train_dataset_path
+    if train_path is not None:
+        train_dataset_path = train_path
+    if os.path.isdir(train_dataset_path):
+        # a directory of shards, e.g. from the streaming conversion; max_epochs = -1 makes spaCy stream the corpus
+        # every epoch instead of loading all of it into memory to shuffle it
+        overrides["training.max_epochs"] = -1
 
-    # TODO: externalize these configurations and expose more customizations
-    train(
-        "spacy_impl/training_config/config.cfg", model_store_directory,
-        overrides={
-            "paths.train": train_dataset_path,
-            "paths.dev": train_dataset_path
-        }
+    training_profile = load_profile(
+        profile, batcher=batcher, batch_size=batch_size, max_steps=max_steps, max_seconds=max_seconds,
+        eval_frequency=eval_frequency
     )
+    throughput_path = os.path.join(experiment_path, "results", "training_throughput.json")
+    overrides.update(profile_overrides(training_profile))
+    overrides["training.logger.output_path"] = throughput_path
+
+    # a model-best left by an earlier run would otherwise stand in for this one if it ends before evaluating
+    for model_name in ["model-best", "model-last"]:
+        shutil.rmtree(os.path.join(model_store_directory, model_name), ignore_errors=True)
+    try:
+        train(
+            "spacy_impl/training_config/config.cfg", model_store_directory,
+            overrides={
+                "paths.train": train_dataset_path,
+                "paths.dev": dev_dataset_path,
+                "paths.vectors": vectors,
+                **overrides,
+                **config_overrides
+            }
+        )
+    except TrainingBudgetExhausted as e:
+        print(e)
+
+    model_best = os.path.join(model_store_directory, "model-best")
+    model_last = os.path.join(model_store_directory, "model-last")
+    if not os.path.isdir(model_best):
+        # the budget ran out before the first evaluation, so spaCy only saved model-last
+        if not os.path.isdir(model_last):
+            raise FileNotFoundError(f"Training wrote neither model-best nor model-last to {model_store_directory}")
+        print(f"warning: no evaluation ran before training stopped, using model-last as {model_best}")
+        shutil.copytree(model_last, model_best)
+
+    with open(throughput_path) as throughput_file:
+        throughput = json.load(throughput_file)
+    throughput["profile"] = {"name": profile, **training_profile}
+    with open(throughput_path, "w") as throughput_file:
+        json.dump(throughput, throughput_file, indent=4)
+    print(f"training profile {profile}: {throughput['words_per_second']:.0f} words/sec")
+    return throughput
 
 
 # if __name__ == "__main__":
@@ -0,0 +1,73 @@
+import json
+import os
+import time
+from typing import Optional
+
+import spacy
+
+PROFILES_PATH = "spacy_impl/training_config/training_profiles.json"
+
+
+class TrainingBudgetExhausted(Exception):
+    pass
+
+
+def load_profile(name: str = "default", **overrides) -> dict:
+    """A profile from training_profiles.json, with any non-None `overrides` applied"""
+    with open(PROFILES_PATH) as profiles_file:
+        profile = json.load(profiles_file)[name]
+    profile.update({key: value for key, value in overrides.items() if value is not None})
+    return profile
+
+
+def profile_overrides(profile: dict) -> dict:
+    """Config overrides that apply a profile to training_config/config.cfg"""
+    overrides = {
+        "training.batcher.@batchers": profile["batcher"],
+        "nlp.batch_size": profile["nlp_batch_size"],
+        "training.max_steps": profile["max_steps"],
+        "training.eval_frequency": profile["eval_frequency"],
+        "training.logger.max_seconds": profile["max_seconds"]
+    }
+    overrides.update({f"training.batcher.size.{key}": value for key, value in profile["batch_size"].items()})
+    return overrides
+
+
+@spacy.registry.loggers("sentencing.throughput_logger.v1")
+def throughput_logger(progress_bar=False, max_seconds: Optional[float] = None, output_path: Optional[str] = None):
+    """spaCy's console logger, plus a wall-clock budget and a words/sec summary
+
+    Raises `TrainingBudgetExhausted` once training has run for `max_seconds`; spaCy saves model-last on the way
+    out. The steps run, and the words seen, seconds and words/sec as of the last evaluation, are written to
+    `output_path` as JSON.
+    """
+    console_logger = spacy.registry.loggers.get("spacy.ConsoleLogger.v3")(progress_bar=progress_bar or None)
+
+    def setup_logger(nlp, stdout, stderr):
+        log_step, finalize = console_logger(nlp, stdout, stderr)
+        start = time.perf_counter()
+        throughput = {"steps": 0, "words": 0, "seconds": 0.0}
+
+        def log_throughput_step(info):
+            # spaCy only passes `info` on evaluation steps, so words and seconds are as of the last evaluation
+            log_step(info)
+            elapsed = time.perf_counter() - start
+            throughput["steps"] += 1
+            if info is not None:
+                throughput.update(words=info["words"], seconds=elapsed)
+            if max_seconds and elapsed > max_seconds:
+                raise TrainingBudgetExhausted(f"training stopped after its {max_seconds}s budget")
+
+        def finalize_throughput():
+            finalize()
+            throughput["words_per_second"] = (
+                throughput["words"] / throughput["seconds"] if throughput["seconds"] else 0.0
+            )
+            if output_path is not None:
+                os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+                with open(output_path, "w") as output_file:
+                    json.dump(throughput, output_file, indent=4)
+
+        return log_throughput_step, finalize_throughput
+
+    return setup_logger
@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+from collections import Counter
+
+import spacy
+from spacy.tokens import DocBin
+from spacy.training.corpus import walk_corpus
+from spacy.vectors import Vectors
+from thinc.api import get_current_ops
+
+
+def ensure_package(name: str):
+    """Downloads a spaCy package unless it's installed already or `name` is a local path"""
+    if not os.path.exists(name) and not spacy.util.is_package(name):
+        spacy.cli.download(name)
+
+
+def training_corpus(dataset_path: str) -> str:
+    """The dataset's training corpus, the streaming conversion's shard directory when there is one
+
+    Vectors are pruned to the training corpus only: words that appear only in the test set must stay out of
+    vocabulary, as unseen words in production text would be.
+    """
+    shard_directory = os.path.join(dataset_path, "spacy", "train")
+    return shard_directory if os.path.isdir(shard_directory) else os.path.join(dataset_path, "spacy", "train.spacy")
+
+
+def corpus_word_counts(corpus_paths: list) -> Counter:
+    """Token text counts over .spacy files or directories of shards"""
+    nlp = spacy.blank("en")
+    counts = Counter()
+    for corpus_path in corpus_paths:
+        for shard in walk_corpus(corpus_path, ".spacy"):
+            for doc in DocBin().from_disk(shard).get_docs(nlp.vocab):
+                counts.update(token.text for token in doc)
+    return counts
+
+
+def frequent_words(vectors: Vectors, strings, top_n: int, frequency_list: str = None) -> list:
+    """The `top_n` most frequent words, from a one-word-per-line `frequency_list` or else the vector table's row
+    order, which for the en_core_web vectors follows corpus frequency"""
+    if frequency_list is not None:
+        with open(frequency_list, encoding="utf-8") as frequency_file:
+            return [line.strip() for line, _ in zip(frequency_file, range(top_n)) if line.strip()]
+    rows_to_keys = sorted((row, key) for key, row in vectors.key2row.items())
+    return [strings[key] for row, key in rows_to_keys[:top_n] if key in strings]
+
+
+def build_pruned_vectors(corpus_paths: list, output_path: str, source: str = "en_core_web_lg", top_n: int = 20000,
+                         frequency_list: str = None) -> dict:
+    """Writes a vectors-only pipeline to `output_path` holding the `source` vectors of every word in the corpus plus
+    the `top_n` most frequent words, to be used as `paths.vectors` for training without the full `source` package
+
+    Returns the summary written next to it as pruning.json.
+    """
+    ensure_package(source)
+    source_nlp = spacy.load(source, exclude=["tok2vec", "tagger", "parser", "senter", "attribute_ruler",
+                                             "lemmatizer", "ner"])
+    source_vectors = source_nlp.vocab.vectors
+    strings = source_nlp.vocab.strings
+
+    corpus_counts = corpus_word_counts(corpus_paths)
+    candidates = [word for word, _ in corpus_counts.most_common()]
+    candidates += frequent_words(source_vectors, strings, top_n, frequency_list)
+    words, rows = [], []
+    for word in dict.fromkeys(candidates):
+        row = source_vectors.find(key=strings[word])
+        if row >= 0:
+            words.append(word)
+            rows.append(row)
+
+    nlp = spacy.blank(source_nlp.lang)
+    data = get_current_ops().to_numpy(source_vectors.data)[rows]
+    nlp.vocab.vectors = Vectors(strings=nlp.vocab.strings, data=data, keys=[nlp.vocab.strings.add(w) for w in words])
+    nlp.to_disk(output_path)
+
+    covered = sum(count for word, count in corpus_counts.items() if source_vectors.find(key=strings[word]) >= 0)
+    summary = {
+        "source": source,
+        "source_rows": int(source_vectors.shape[0]),
+        "rows": len(words),
+        "top_n": top_n,
+        "corpus_words": len(corpus_counts),
+        "corpus_token_coverage": covered / max(sum(corpus_counts.values()), 1)
+    }
+    with open(os.path.join(output_path, "pruning.json"), "w") as summary_file:
+        json.dump(summary, summary_file, indent=4)
+    print(f"pruned {source} from {summary['source_rows']} to {summary['rows']} vectors, "
+          f"{summary['corpus_token_coverage']:.1%} of corpus tokens covered")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build pruned static vectors for a dataset")
+    parser.add_argument("dataset_path", help="e.g. datasets/<name>, reads its spacy/ training corpus, writes vectors/")
+    parser.add_argument("--source", default="en_core_web_lg")
+    parser.add_argument("--top-n", type=int, default=20000)
+    parser.add_argument("--frequency-list", default=None)
+    args = parser.parse_args()
+    build_pruned_vectors(
+        [training_corpus(args.dataset_path)], os.path.join(args.dataset_path, "vectors"), source=args.source,
+        top_n=args.top_n, frequency_list=args.frequency_list
+    )
@@ -1,9 +1,11 @@
+import os
 import pandas as pd
 import json
 import numpy as np
+import pyarrow.parquet as pq
 
 from json import JSONDecodeError
-from utilities.utils import load_json_list, filter_labels
+from utilities.utils import load_json_list
 
 
 class BaseFormat:
@@ -11,6 +13,16 @@ class BaseFormat:
     def __init__(self, entities: pd.DataFrame):
         self.entities = entities
 
+    @classmethod
+    def load(cls, dataset_path: str):
+        return cls(pd.read_csv(dataset_path))
+
+    @classmethod
+    def load_chunks(cls, dataset_path: str, chunk_size: int):
+        """Lazily yields the dataset `chunk_size` rows at a time"""
+        for chunk in pd.read_csv(dataset_path, chunksize=chunk_size):
+            yield cls(chunk)
+
     def format_label(self, **kwargs):
         raise NotImplementedError
 
@@ -64,15 +76,143 @@ class LabelStudio(BaseFormat):
             .str.replace("<NA>", "None", regex=False)  # Replace "nan" strings with "None"
             .str.replace("nan", "None", regex=False)
         )
-        # label_mappings = self.csv_transformations.get("map_labels")
-        if label_mappings:
-            for key, value in label_mappings.items():
-                self.entities["label"].str.replace(key, value, regex=False)
-
         self.entities["label"] = self.entities["label"].apply(load_json_list)
         self.entities['label'] = self.entities['label'].apply(
             lambda x: json.dumps(eval(x)) if isinstance(x, str) else x
         )
+        # label_mappings = self.csv_transformations.get("map_labels")
+        if label_mappings:
+            # exact label names, as in `SpanTable.map_labels` and the Label Studio JSON loader
+            self.entities["label"] = self.entities["label"].apply(
+                lambda label_list: [
+                    {**label, "labels": [label_mappings.get(name, name) for name in label["labels"]]}
+                    for label in label_list
+                ] if isinstance(label_list, list) else label_list
+            )
+
+
+def span_table_paths(dataset_path: str):
+    """Paths of the docs and spans tables stored next to a split CSV, e.g. train_df.csv -> train_docs.parquet"""
+    prefix = os.path.splitext(dataset_path)[0]
+    prefix = prefix[:-len("_df")] if prefix.endswith("_df") else prefix
+    return f"{prefix}_docs.parquet", f"{prefix}_spans.parquet"
+
+
+def full_table_paths(dataset_directory: str):
+    """Paths of the docs and spans tables of a dataset's full table, which the splits in splits.json index into"""
+    return os.path.join(dataset_directory, "full_docs.parquet"), os.path.join(dataset_directory, "full_spans.parquet")
+
+
+class SpanTable(BaseFormat):
+    """Normalized span storage, one row per (doc_id, start, end, label)
+
+    `entities` holds one row per document (doc_id, categorical Source, Text) and `spans` one row per labeled span with
+    a categorical label, so labels can be mapped and filtered without parsing any per-row label strings.
+    """
+
+    def __init__(self, entities: pd.DataFrame, spans: pd.DataFrame):
+        super().__init__(entities)
+        self.spans = spans
+
+    @classmethod
+    def from_label_lists(cls, df: pd.DataFrame):
+        """Builds the tables from a frame whose `label` column holds lists of LabelStudio style label dicts"""
+        doc_ids, starts, ends, labels = [], [], [], []
+        for doc_id, label_list in zip(df.index, df["label"]):
+            for label in label_list:
+                if label["labels"] and not pd.isna(label["start"]):
+                    doc_ids.append(doc_id)
+                    starts.append(label["start"])
+                    ends.append(label["end"])
+                    labels.append(label["labels"][0])
+        entities = pd.DataFrame({
+            "doc_id": df.index.to_numpy(),
+            "Source": pd.Categorical(df["Source"]),
+            "Text": df["Text"].to_numpy()
+        })
+        spans = pd.DataFrame({
+            "doc_id": np.asarray(doc_ids, dtype=entities["doc_id"].dtype),
+            "start": np.asarray(starts, dtype=np.int64),
+            "end": np.asarray(ends, dtype=np.int64),
+            "label": pd.Categorical(labels)
+        })
+        return cls(entities, spans)
+
+    @classmethod
+    def load(cls, dataset_path: str):
+        docs_path, spans_path = span_table_paths(dataset_path)
+        return cls(pd.read_parquet(docs_path), pd.read_parquet(spans_path))
+
+    @classmethod
+    def load_split(cls, dataset_directory: str, split_name: str, part: str):
+        """Loads the `part` ("train" or "test") of a split listed in the directory's splits.json manifest
+
+        `split_name` None loads the first split, the one the dataset's metadata describes.
+        """
+        with open(os.path.join(dataset_directory, "splits.json")) as manifest_file:
+            splits = json.load(manifest_file)["splits"]
+        doc_ids = splits[split_name if split_name is not None else next(iter(splits))][part]
+        docs_path, spans_path = full_table_paths(dataset_directory)
+        entities = pd.read_parquet(docs_path, filters=[("doc_id", "in", doc_ids)])
+        spans = pd.read_parquet(spans_path, filters=[("doc_id", "in", doc_ids)])
+        return cls(entities.reset_index(drop=True), spans.reset_index(drop=True))
+
+    @classmethod
+    def load_chunks(cls, dataset_path: str, chunk_size: int):
+        """Lazily yields `chunk_size` documents at a time together with their spans
+
+        Spans are stored in document order, so the spans of each chunk are read as a running prefix of the spans
+        file and only one batch of either table is held in memory.
+        """
+        docs_path, spans_path = span_table_paths(dataset_path)
+        span_batches = (
+            batch.to_pandas() for batch in pq.ParquetFile(spans_path).iter_batches(batch_size=chunk_size)
+        )
+        pending = pd.DataFrame(columns=["doc_id", "start", "end", "label"])
+        for batch in pq.ParquetFile(docs_path).iter_batches(batch_size=chunk_size):
+            entities = batch.to_pandas()
+            doc_ids = set(entities["doc_id"].tolist())
+            spans = [pending]
+            while spans[-1].empty or spans[-1]["doc_id"].iloc[-1] in doc_ids:
+                next_batch = next(span_batches, None)
+                if next_batch is None:
+                    break
+                spans.append(next_batch)
+            spans = pd.concat([frame for frame in spans if not frame.empty] or [pending], ignore_index=True)
+            in_chunk = spans["doc_id"].isin(doc_ids).to_numpy()
+            # the spans of this chunk are a prefix, the rest belongs to the following chunks
+            prefix_length = len(spans) if in_chunk.all() else int(np.argmin(in_chunk))
+            pending = spans.iloc[prefix_length:].reset_index(drop=True)
+            yield cls(entities, spans.iloc[:prefix_length].reset_index(drop=True))
+
+    def to_parquet(self, docs_path: str, spans_path: str):
+        self.entities.to_parquet(docs_path, index=False)
+        self.spans.to_parquet(spans_path, index=False)
+
+    def map_labels(self, label_mappings: dict):
+        # only the categories are renamed, merging codes where two labels map onto the same name
+        labels = self.spans["label"].cat
+        mapped = pd.Index([label_mappings.get(label, label) for label in labels.categories])
+        categories = mapped.unique()
+        codes = labels.codes.to_numpy()
+        new_codes = np.where(codes >= 0, categories.get_indexer(mapped)[codes], -1)
+        self.spans["label"] = pd.Categorical.from_codes(new_codes, categories=categories)
+
+    def filter_labels(self, label_list: list):
+        self.spans = self.spans[self.spans["label"].isin(label_list)].reset_index(drop=True)
+
+    def get_labels(self):
+        """Same structure as `LabelStudio.get_labels`: one list of label dicts per document that has spans"""
+        texts = dict(zip(self.entities["doc_id"].tolist(), self.entities["Text"].tolist()))
+        labels = {}
+        for doc_id, start, end, label in zip(
+                self.spans["doc_id"].tolist(), self.spans["start"].tolist(), self.spans["end"].tolist(),
+                self.spans["label"].tolist()
+        ):
+            labels.setdefault(doc_id, []).append({"start": start, "end": end, "text": texts[doc_id], "labels": [label]})
+        return pd.Series(
+            [labels[doc_id] for doc_id in texts if doc_id in labels], dtype=object
+        )
 
 
 class AWSComprehend(BaseFormat):
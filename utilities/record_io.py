@@ -0,0 +1,108 @@
+import csv
+import dataclasses
+import json
+import os
+from enum import Enum
+
+
+def read_jsonl(path: str, id_key: str = "id", text_key: str = "text"):
+    """Lazily yields {"id", "text"} records from a JSON lines file"""
+    with open(path, "r", encoding="utf-8") as input_file:
+        for line in input_file:
+            if line.strip():
+                record = json.loads(line)
+                yield {"id": record[id_key], "text": record[text_key]}
+
+
+def read_csv(path: str, id_key: str = "id", text_key: str = "text"):
+    """Lazily yields {"id", "text"} records from a CSV file with a header row"""
+    with open(path, "r", encoding="utf-8", newline="") as input_file:
+        for record in csv.DictReader(input_file):
+            yield {"id": record[id_key], "text": record[text_key]}
+
+
+def read_records(path: str, **kwargs):
+    """Picks a reader from the file extension"""
+    if path.endswith(".csv"):
+        return read_csv(path, **kwargs)
+    if path.endswith(".jsonl") or path.endswith(".json"):
+        return read_jsonl(path, **kwargs)
+    raise ValueError(f"Unsupported input format for {path}, expected .csv or .jsonl")
+
+
+def to_serializable(value):
+    """`json.dumps` default for the objects that end up in analysis responses"""
+    if isinstance(value, Enum):
+        return value.value
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if dataclasses.is_dataclass(value):
+        return dataclasses.asdict(value)
+    return vars(value)
+
+
+def to_jsonl_line(record: dict) -> bytes:
+    return (json.dumps(record, default=to_serializable) + "\n").encode("utf-8")
+
+
+def write_jsonl(records, path: str):
+    """Writes records one per line without holding them in memory, returns the number written"""
+    count = 0
+    with open(path, "wb") as output_file:
+        for record in records:
+            output_file.write(to_jsonl_line(record))
+            count += 1
+    return count
+
+
+def load_checkpoint(path: str):
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path) as checkpoint_file:
+        return json.load(checkpoint_file)
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    # write then rename so a crash mid-write never leaves a truncated checkpoint behind
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(temporary_path, path)
+
+
+def iter_json_array(path: str, buffer_size: int = 1 << 20):
+    """Lazily yields the objects of a file holding one top-level JSON array of objects, e.g. a Label Studio export
+
+    Only the element being decoded and one read buffer are held in memory, instead of the whole parsed file.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as input_file:
+        buffer = input_file.read(buffer_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} does not hold a JSON array")
+        position = 1
+        eof = False
+        while True:
+            # skip whitespace and the comma between elements
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                if position >= len(buffer):
+                    raise json.JSONDecodeError("buffer exhausted", buffer, position)
+                element, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # the element continues past the buffer: drop what's consumed and read more, doubling the read size
+                # so elements larger than the buffer are decoded in a logarithmic number of attempts
+                chunk = input_file.read(max(buffer_size, len(buffer) - position))
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield element
+            position = end
@@ -0,0 +1,16 @@
+import random
+
+SAMPLE_SENTENCES = [
+    "12 MONTHS JAIL, SUSPENDED",
+    "DEFENDANT SENTENCED TO 2 YEARS 6 MONTHS CONFINEMENT",
+    "3 YEARS PROBATION, 90 DAYS JAIL",
+    "FIVE YEARS SUSPENDED SENTENCE AND 1 YEAR PROBATION",
+    "30 DAYS JAIL CREDIT FOR TIME SERVED, FINES AND COSTS $250",
+    "CONFINEMENT 6 MOS 15 DAYS",
+]
+
+
+def generate_sentences(num_sentences: int, seed: int = 0):
+    """{"id", "text"} records drawn from `SAMPLE_SENTENCES`, for benchmarks and load tests"""
+    rng = random.Random(seed)
+    return [{"id": str(i), "text": rng.choice(SAMPLE_SENTENCES)} for i in range(num_sentences)]
@@ -0,0 +1,243 @@
+import ast
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+class FileHasher:
+    """Content hashes of files and directories, remembered by (size, mtime) so unchanged files are read only once
+
+    Attributes
+    ----------
+    cache_path : str
+        JSON file the remembered hashes are kept in between runs
+    """
+
+    def __init__(self, cache_path: str):
+        self.cache_path = cache_path
+        self.hashes = {}
+        if os.path.exists(cache_path):
+            with open(cache_path) as cache_file:
+                self.hashes = json.load(cache_file)
+
+    def file_hash(self, path: str) -> str:
+        stat = os.stat(path)
+        cached = self.hashes.get(path)
+        if cached is not None and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["sha256"]
+        digest = hashlib.sha256()
+        with open(path, "rb") as input_file:
+            while block := input_file.read(1 << 20):
+                digest.update(block)
+        self.hashes[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+        return digest.hexdigest()
+
+    def path_hash(self, path: str):
+        """Hash of a file, or of every file under a directory with their relative paths; None when it doesn't exist"""
+        if os.path.isfile(path):
+            return self.file_hash(path)
+        if not os.path.isdir(path):
+            return None
+        digest = hashlib.sha256()
+        for root, directories, names in os.walk(path):
+            directories.sort()
+            for name in sorted(names):
+                file_path = os.path.join(root, name)
+                digest.update(os.path.relpath(file_path, path).encode())
+                digest.update(self.file_hash(file_path).encode())
+        return digest.hexdigest()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        with open(self.cache_path, "w") as cache_file:
+            json.dump(self.hashes, cache_file)
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _imported_modules(path: str) -> set:
+    """Project source files imported anywhere in the source file at `path`"""
+    with open(path) as source_file:
+        tree = ast.parse(source_file.read(), path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module is not None:
+            # the imported names may be modules themselves
+            names.add(node.module)
+            names.update(f"{node.module}.{alias.name}" for alias in node.names)
+    paths = {os.path.join(PROJECT_ROOT, *name.split(".")) + ".py" for name in names}
+    return {module_path for module_path in paths if os.path.isfile(module_path)}
+
+
+def project_modules(function) -> list:
+    """Source files of the project modules `function` can run: its own module and, transitively, every project
+    module imported by one of them, as read from their import statements. A stage function defined in a runner
+    script would depend on everything the script imports, so stage functions are kept in library modules.
+    """
+    pending = [os.path.abspath(inspect.getfile(function))]
+    paths = set()
+    while pending:
+        path = pending.pop()
+        if path not in paths:
+            paths.add(path)
+            pending.extend(_imported_modules(path))
+    return sorted(paths)
+
+
+class Stage:
+    """One step of a `StageGraph`, run as `function(**params)`
+
+    A stage depends on every stage that writes one of its `inputs`. It is skipped when its key, the hash of the
+    project modules its function can run (see `project_modules`), `version`, params and the content of its inputs,
+    matches the last successful run and its outputs still hold what that run wrote. Changes outside the project, e.g. a new spaCy release, aren't
+    seen and need a new `version`.
+
+    Attributes
+    ----------
+    name : str
+        unique name of the stage
+    function : callable
+        module-level function, so it can be sent to a worker process
+    params : dict
+        JSON-serializable keyword arguments of `function`
+    inputs, outputs : list
+        files or directories the stage reads and writes
+    version : str
+        declared version of what the stage computes, to be bumped when its outputs change for the same code
+    """
+
+    def __init__(self, name: str, function, params: dict = None, inputs: list = None, outputs: list = None,
+                 version: str = None):
+        self.name = name
+        self.function = function
+        self.params = params or {}
+        self.inputs = inputs or []
+        self.outputs = outputs or []
+        self.version = version
+
+    def key(self, hasher: FileHasher) -> str:
+        content = {
+            # not the module, which is __main__ or not depending on how the runner was started
+            "function": self.function.__qualname__,
+            "modules": {
+                os.path.relpath(path, PROJECT_ROOT): hasher.file_hash(path) for path in project_modules(self.function)
+            },
+            "version": self.version,
+            "params": self.params,
+            "inputs": {path: hasher.path_hash(path) for path in self.inputs}
+        }
+        return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _run_stage(function, params: dict) -> float:
+    start = time.perf_counter()
+    function(**params)
+    return time.perf_counter() - start
+
+
+class StageGraph:
+    """Runs stages in dependency order, skipping those that are up to date and running independent ones concurrently
+
+    The key and output hashes of every successful stage are kept in `state_dir`/stages.json. When a stage fails, the
+    stages already running are finished, nothing depending on it is started, and the error is raised.
+
+    Attributes
+    ----------
+    stages : dict
+        `Stage` by name
+    dependencies : dict
+        names of the stages each stage waits for
+    state_dir : str
+        where stage state and remembered file hashes are kept
+    max_workers : int
+        number of stages run at once, each in its own process
+    """
+
+    def __init__(self, stages: list, state_dir: str, max_workers: int = 2):
+        self.stages = {stage.name: stage for stage in stages}
+        writers = {os.path.normpath(output): stage.name for stage in stages for output in stage.outputs}
+        self.dependencies = {
+            stage.name: {
+                writer for path, writer in writers.items() for input_path in stage.inputs
+                if writer != stage.name and (os.path.normpath(input_path) == path
+                                             or os.path.normpath(input_path).startswith(path + os.sep))
+            }
+            for stage in stages
+        }
+        self.state_dir = state_dir
+        self.max_workers = max_workers
+        self.hasher = FileHasher(os.path.join(state_dir, "file_hashes.json"))
+        self.state_path = os.path.join(state_dir, "stages.json")
+        self.state = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as state_file:
+                self.state = json.load(state_file)
+
+    def is_up_to_date(self, stage: Stage, key: str) -> bool:
+        previous = self.state.get(stage.name)
+        return previous is not None and previous["key"] == key and all(
+            self.hasher.path_hash(path) == previous["outputs"].get(path) for path in stage.outputs
+        )
+
+    def _save_state(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        with open(self.state_path, "w") as state_file:
+            json.dump(self.state, state_file, indent=4)
+        self.hasher.save()
+
+    def run(self, force: tuple = ()) -> dict:
+        """Runs every stage that isn't up to date, plus the stages in `force`; returns what happened to each stage"""
+        report = {}
+        keys = {}
+        done = set()
+        failed = None
+        running = {}
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            while len(done) + len(running) < len(self.stages) or running:
+                ready = [
+                    name for name in self.stages
+                    if name not in done and name not in running.values() and self.dependencies[name] <= done
+                ]
+                for name in ready if failed is None else []:
+                    stage = self.stages[name]
+                    keys[name] = stage.key(self.hasher)
+                    if name not in force and self.is_up_to_date(stage, keys[name]):
+                        report[name] = {"status": "skipped"}
+                        print(f"stage {name}: up to date")
+                        done.add(name)
+                    else:
+                        print(f"stage {name}: running")
+                        running[executor.submit(_run_stage, stage.function, stage.params)] = name
+                if not running:
+                    if failed is not None or not ready:
+                        break
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    if future.exception() is not None:
+                        report[name] = {"status": "failed", "error": repr(future.exception())}
+                        failed = failed or future.exception()
+                        continue
+                    stage = self.stages[name]
+                    self.state[name] = {
+                        "key": keys[name],
+                        "outputs": {path: self.hasher.path_hash(path) for path in stage.outputs},
+                        "seconds": future.result()
+                    }
+                    self._save_state()
+                    report[name] = {"status": "ran", "seconds": future.result()}
+                    print(f"stage {name}: done in {future.result():.1f}s")
+                    done.add(name)
+        self.hasher.save()
+        if failed is not None:
+            raise failed
+        if len(done) < len(self.stages):
+            raise ValueError(f"Stages {sorted(set(self.stages) - done)} depend on each other in a cycle")
+        return report
@@ -1,5 +1,8 @@
 import ast
 
+import numpy as np
+import pandas as pd
+
 
 def is_label_present(labels, label):
     return label in labels
@@ -21,3 +24,59 @@ def filter_labels(annotation, label_list):
         # elif len(label["labels"]) > 0:
         #     print(f"Did not find label {label['labels'][0]} in list")
     return new_label
+
+
+def explode_labels(df: pd.DataFrame, columns: list = None) -> pd.DataFrame:
+    """Long-format label table with one row per label instance
+
+    `row_id` is the position of the instance's row in `df`, `label` its first label (None when it has no labels) and
+    any `columns` are copied over from that row.
+    """
+    counts = df["label"].str.len().to_numpy()
+    row_ids = np.repeat(np.arange(len(df)), counts)
+    table = pd.DataFrame({
+        "row_id": row_ids,
+        "label": [label["labels"][0] if label["labels"] else None for labels in df["label"] for label in labels]
+    })
+    for column in columns or []:
+        table[column] = df[column].to_numpy()[row_ids]
+    return table
+
+
+def label_presence_matrix(df: pd.DataFrame, label_list: list) -> np.ndarray:
+    """Boolean (rows x labels) matrix, True where the row has at least one instance of the label"""
+    table = explode_labels(df)
+    codes = pd.Categorical(table["label"], categories=label_list).codes
+    present = codes >= 0
+    matrix = np.zeros((len(df), len(label_list)), dtype=bool)
+    matrix[table["row_id"].to_numpy()[present], codes[present]] = True
+    return matrix
+
+
+def label_bitmask(matrix: np.ndarray) -> np.ndarray:
+    """Packs a presence matrix into one unsigned integer per row, bit i set when label i is present"""
+    num_labels = matrix.shape[1]
+    dtype = np.uint16 if num_labels <= 16 else np.uint32 if num_labels <= 32 else np.uint64
+    assert num_labels <= 64, f"at most 64 labels fit in a bitmask, got {num_labels}"
+    return (matrix.astype(dtype) << np.arange(num_labels, dtype=dtype)).sum(axis=1, dtype=dtype)
+
+
+def to_metadata_key(value):
+    return None if pd.isna(value) else value
+
+
+def label_summary(df: pd.DataFrame) -> dict:
+    """Rows per source and label instances per label, overall and per source"""
+    table = explode_labels(df, columns=["Source"])
+    label_counts = table.groupby("label", dropna=False).size()
+    by_source = table.groupby(["Source", "label"], dropna=False).size()
+    label_counts_by_source = {}
+    for (source, label), count in by_source.items():
+        label_counts_by_source.setdefault(to_metadata_key(source), {})[to_metadata_key(label)] = int(count)
+    return {
+        "sources": {
+            to_metadata_key(source): int(count) for source, count in df["Source"].value_counts(dropna=False).items()
+        },
+        "label_counts": {to_metadata_key(label): int(count) for label, count in label_counts.items()},
+        "label_counts_by_source": label_counts_by_source
+    }